@@ -0,0 +1,123 @@
+"""Local stand-in IP providers, for offline testing of grab_ip.py.
+
+Each server answers every GET with a fixed IP in one provider's style:
+ifconfig.co JSON, ipinfo.io JSON (ASN folded into "org") or plain text.
+Change server.ip / server.asn while it runs to simulate an IP change.
+"""
+
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    """Answer with the server's current IP in its configured style."""
+
+    server_version = "StandinIP/1.0"
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        """Return the IP after the configured delay."""
+        server = self.server
+        server.hits += 1
+        if server.delay:
+            time.sleep(server.delay)
+        if server.status != 200:
+            self._send(server.status, "text/plain", b"simulated failure")
+        elif server.style == "text":
+            self._send(200, "text/plain", f"{server.ip}\n".encode("utf-8"))
+        elif server.style == "ipinfo":
+            body = {"ip": server.ip, "org": f"{server.asn} {server.asn_org}"}
+            self._send(200, "application/json", json.dumps(body).encode("utf-8"))
+        else:
+            body = {"ip": server.ip, "asn": server.asn, "asn_org": server.asn_org}
+            self._send(200, "application/json", json.dumps(body).encode("utf-8"))
+
+    def _send(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+def start_server(
+    host="127.0.0.1",
+    port=0,
+    style="ifconfig",
+    ip="203.0.113.7",
+    asn="AS64500",
+    asn_org="Example Networks",
+    delay=0.0,
+    status=200,
+    verbose=False,
+):
+    """Start a stand-in provider on a background thread and return it.
+
+    Pass port=0 to pick a free port; the bound address is server.server_address
+    and server.hits counts requests. Call server.shutdown() when done.
+    """
+    server = ThreadingHTTPServer((host, port), StandinHandler)
+    server.daemon_threads = True
+    server.style = style
+    server.ip = ip
+    server.asn = asn
+    server.asn_org = asn_org
+    server.delay = delay
+    server.status = status
+    server.verbose = verbose
+    server.hits = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def provider_for(server):
+    """Provider entry for grab_ip.py pointing at a stand-in server."""
+    host, port = server.server_address[:2]
+    provider = {"name": f"{server.style}:{port}", "url": f"http://{host}:{port}/"}
+    if server.style == "text":
+        provider["format"] = "text"
+    elif server.style == "ipinfo":
+        provider.update(ip_key="ip", org_key="org")
+    else:
+        provider.update(ip_key="ip", asn_key="asn", org_key="asn_org")
+    return provider
+
+
+def main():
+    """Run stand-in providers in the foreground and print a providers file."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--delays",
+        default="0.5,0.1,1.0",
+        help="Comma-separated delays, one ifconfig/ipinfo/text server each",
+    )
+    parser.add_argument("--ip", default="203.0.113.7")
+    parser.add_argument(
+        "-o", "--output", default="fake_providers.json", help="Providers file"
+    )
+    args = parser.parse_args()
+
+    styles = ("ifconfig", "ipinfo", "text")
+    servers = [
+        start_server(style=styles[index % 3], ip=args.ip, delay=float(delay))
+        for index, delay in enumerate(args.delays.split(","))
+    ]
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump([provider_for(server) for server in servers], file, indent=2)
+    print(f"[*] {len(servers)} stand-in providers running, listed in {args.output}")
+    print(f"    python grab_ip.py --providers {args.output} --no-cache")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        for server in servers:
+            server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
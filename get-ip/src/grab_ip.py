@@ -1,19 +1,277 @@
-"""Script to fetch and display the public IP address using ifconfig.co API."""
+"""Script to fetch and display the public IP address from the fastest of several providers."""
+
+import argparse
+import ipaddress
+import json
+import os
+import queue
+import re
+import subprocess
+import threading
+import time
 
 import requests
 
+# Each provider is asked at once and the first valid answer wins. "format" is
+# json or text; the *_key entries name the JSON fields holding each value.
+DEFAULT_PROVIDERS = [
+    {
+        "name": "ifconfig.co",
+        "url": "https://ifconfig.co/json",
+        "ip_key": "ip",
+        "asn_key": "asn",
+        "org_key": "asn_org",
+    },
+    {
+        "name": "ipinfo.io",
+        "url": "https://ipinfo.io/json",
+        "ip_key": "ip",
+        "org_key": "org",  # "AS15169 Google LLC"
+    },
+    {
+        "name": "ipapi.co",
+        "url": "https://ipapi.co/json/",
+        "ip_key": "ip",
+        "asn_key": "asn",
+        "org_key": "org",
+    },
+    {"name": "ipify", "url": "https://api.ipify.org", "format": "text"},
+]
+TIMEOUT = 5
+CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "get-ip", "ip.json")
+CACHE_TTL = 300
+ASN_PREFIX = re.compile(r"^(AS\d+)\s+(.*)$")
+
+
+def parse_answer(provider, response):
+    """Turn a provider response into {ip, asn, asn_org}, or None if invalid."""
+    if provider.get("format") == "text":
+        data = {"ip": response.text.strip()}
+    else:
+        body = response.json()
+        if not isinstance(body, dict):
+            return None
+        data = {
+            "ip": body.get(provider.get("ip_key", "ip")),
+            "asn": body.get(provider["asn_key"]) if "asn_key" in provider else None,
+            "asn_org": body.get(provider["org_key"]) if "org_key" in provider else None,
+        }
+        # Some providers fold the ASN into the organisation name
+        match = ASN_PREFIX.match(data["asn_org"] or "")
+        if match:
+            data["asn"] = data["asn"] or match.group(1)
+            data["asn_org"] = match.group(2)
+
+    try:
+        data["ip"] = str(ipaddress.ip_address(str(data["ip"]).strip()))
+    except ValueError:
+        return None
+    data.setdefault("asn", None)
+    data.setdefault("asn_org", None)
+    return data
+
+
+def query_provider(provider, answers, done):
+    """Ask one provider and put (provider name, answer or error) on answers."""
+    if done.is_set():
+        return  # Someone else already answered
+    try:
+        response = requests.get(provider["url"], timeout=TIMEOUT)
+        response.raise_for_status()
+        answer = parse_answer(provider, response)
+        if answer is None:
+            raise ValueError("response did not contain a valid IP")
+        answers.put((provider["name"], answer))
+    except (requests.exceptions.RequestException, ValueError) as e:
+        answers.put((provider["name"], e))
+
+
+def fastest_lookup(providers, timeout=TIMEOUT):
+    """Ask every provider at once and return the first valid answer.
+
+    Providers that haven't started yet are skipped once one answers, and calls
+    still in flight are abandoned on daemon threads instead of waited for.
+    Raises LookupError if none answers within the timeout.
+    """
+    answers = queue.Queue()
+    done = threading.Event()
+    for provider in providers:
+        threading.Thread(
+            target=query_provider, args=(provider, answers, done), daemon=True
+        ).start()
+
+    deadline = time.monotonic() + timeout
+    errors = []
+    while len(errors) < len(providers):
+        try:
+            name, answer = answers.get(timeout=max(0, deadline - time.monotonic()))
+        except queue.Empty:
+            break
+        if isinstance(answer, Exception):
+            errors.append(f"{name}: {answer}")
+            continue
+        done.set()
+        answer["provider"] = name
+        return answer
+    done.set()
+    raise LookupError("; ".join(errors) or "no provider answered in time")
+
+
+def load_cache(path, ttl):
+    """Return the cached answer if it is younger than ttl seconds."""
+    try:
+        with open(path, "r", encoding="utf-8") as file:
+            cached = json.load(file)
+    except (OSError, ValueError):
+        return None
+    if time.time() - cached.get("fetched_at", 0) > ttl:
+        return None
+    return cached
+
+
+def save_cache(path, answer):
+    """Atomically store an answer with the time it was fetched."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as file:
+        json.dump({**answer, "fetched_at": time.time()}, file)
+    os.replace(tmp_path, path)
 
-def get_public_ip():
-    """Fetches and prints the public IP and ASN organization using ifconfig.co."""
-    url = "https://ifconfig.co/json"
+
+def lookup(providers, cache_path=CACHE_PATH, ttl=CACHE_TTL):
+    """Return the public IP answer, from the cache when it is fresh enough."""
+    if cache_path and ttl > 0:
+        cached = load_cache(cache_path, ttl)
+        if cached:
+            return cached
+    answer = fastest_lookup(providers)
+    if cache_path:
+        save_cache(cache_path, answer)
+    return answer
+
+
+def describe(answer):
+    """One-line description of an answer."""
+    org = " ".join(part for part in (answer.get("asn"), answer.get("asn_org")) if part)
+    return f"{answer['ip']} ({org or 'unknown ASN'})"
+
+
+def has_changed(previous, answer):
+    """Whether the IP changed, or the ASN did when both answers include one."""
+    if answer["ip"] != previous["ip"]:
+        return True
+    old_asn, new_asn = previous.get("asn"), answer.get("asn")
+    return bool(old_asn and new_asn and old_asn != new_asn)
+
+
+def run_hook(hook, answer, previous):
+    """Run the change hook with the new and old values in its environment."""
+    env = dict(os.environ)
+    env.update(
+        IP=answer["ip"],
+        ASN=answer.get("asn") or "",
+        ASN_ORG=answer.get("asn_org") or "",
+        OLD_IP=(previous or {}).get("ip") or "",
+        OLD_ASN=(previous or {}).get("asn") or "",
+    )
+    result = subprocess.run(hook, shell=True, env=env, check=False)
+    if result.returncode:
+        print(f"Hook exited with status {result.returncode}", flush=True)
+
+
+def watch(providers, interval, hook=None, cache_path=CACHE_PATH, sleep=time.sleep):
+    """Poll forever and run the hook whenever the IP or ASN changes.
+
+    `sleep` is called with `interval` between polls.
+    """
+    # Start from the last known answer so a restart doesn't count as a change
+    previous = load_cache(cache_path, float("inf")) if cache_path else None
+    if previous:
+        print(f"Last known IP: {describe(previous)}", flush=True)
+    while True:
+        try:
+            answer = fastest_lookup(providers)
+        except LookupError as e:
+            print(f"Error fetching IP: {e}", flush=True)
+        else:
+            if previous is None:
+                print(
+                    f"Your Public IP: {describe(answer)} via {answer['provider']}",
+                    flush=True,
+                )
+            elif has_changed(previous, answer):
+                print(
+                    f"Public IP changed: {describe(previous)} -> {describe(answer)}",
+                    flush=True,
+                )
+                if hook:
+                    run_hook(hook, answer, previous)
+            else:
+                # Keep the ASN when a provider that doesn't report one wins
+                answer["asn"] = answer.get("asn") or previous.get("asn")
+                answer["asn_org"] = answer.get("asn_org") or previous.get("asn_org")
+            if cache_path:
+                save_cache(cache_path, answer)
+            previous = answer
+        sleep(interval)
+
+
+def load_providers(path):
+    """Load a JSON list of providers in the same shape as DEFAULT_PROVIDERS."""
+    if not path:
+        return DEFAULT_PROVIDERS
+    with open(path, "r", encoding="utf-8") as file:
+        return json.load(file)
+
+
+def get_public_ip(providers=None, cache_path=CACHE_PATH, ttl=CACHE_TTL):
+    """Fetches and prints the public IP and ASN organization."""
     try:
-        response = requests.get(url, timeout=5)
-        response.raise_for_status()  # Raise an error for bad responses (4xx and 5xx)
-        data = response.json()
-        print(f"Your Public IP: {data['ip']} ({data['asn_org']})")
-    except requests.exceptions.RequestException as e:
+        answer = lookup(providers or DEFAULT_PROVIDERS, cache_path, ttl)
+        print(f"Your Public IP: {answer['ip']} ({answer.get('asn_org') or 'unknown'})")
+    except LookupError as e:
         print(f"Error fetching IP: {e}")
 
 
+def main():
+    """Parse arguments and print the IP once or watch it for changes."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--providers", help="JSON file listing the IP providers to race"
+    )
+    parser.add_argument(
+        "--ttl",
+        type=int,
+        default=CACHE_TTL,
+        help=f"Seconds a cached answer stays valid (default: {CACHE_TTL}, 0: off)",
+    )
+    parser.add_argument("--cache-file", default=CACHE_PATH)
+    parser.add_argument(
+        "--no-cache", action="store_true", help="Neither read nor write the cache"
+    )
+    parser.add_argument(
+        "--watch",
+        type=float,
+        metavar="SECONDS",
+        help="Keep polling at this interval and report changes",
+    )
+    parser.add_argument(
+        "--hook",
+        help="Shell command to run when the IP or ASN changes in --watch mode; "
+        "it gets IP, ASN, ASN_ORG, OLD_IP and OLD_ASN in its environment",
+    )
+    args = parser.parse_args()
+
+    providers = load_providers(args.providers)
+    cache_path = None if args.no_cache else args.cache_file
+    if args.watch:
+        try:
+            watch(providers, args.watch, args.hook, cache_path)
+        except KeyboardInterrupt:
+            pass
+    else:
+        get_public_ip(providers, cache_path, args.ttl)
+
+
 if __name__ == "__main__":
-    get_public_ip()
+    main()
@@ -0,0 +1,102 @@
+"""Tests for grab_ip.py against local stand-in IP providers."""
+
+import pytest
+
+import fake_ip_providers
+import grab_ip
+
+
+class StopWatching(Exception):
+    """Raised from the fake sleep to end a watch loop."""
+
+
+@pytest.fixture
+def servers():
+    started = []
+
+    def start(**kwargs):
+        server = fake_ip_providers.start_server(port=0, **kwargs)
+        started.append(server)
+        return server
+
+    yield start
+    for server in started:
+        server.shutdown()
+
+
+def test_fastest_provider_wins(servers):
+    slow = servers(style="ifconfig", ip="198.51.100.1", delay=1.0)
+    fast = servers(style="ipinfo", ip="198.51.100.2", delay=0.0)
+    slower = servers(style="text", ip="198.51.100.3", delay=1.5)
+    providers = [fake_ip_providers.provider_for(s) for s in (slow, fast, slower)]
+
+    answer = grab_ip.fastest_lookup(providers)
+
+    assert answer["ip"] == "198.51.100.2"
+    assert answer["provider"] == providers[1]["name"]
+    assert answer["asn"] == "AS64500"
+
+
+def test_fastest_lookup_skips_failing_providers(servers):
+    broken = servers(status=500)
+    working = servers(style="text", ip="198.51.100.9", delay=0.2)
+
+    answer = grab_ip.fastest_lookup(
+        [
+            fake_ip_providers.provider_for(broken),
+            fake_ip_providers.provider_for(working),
+        ]
+    )
+
+    assert answer["ip"] == "198.51.100.9"
+
+
+def test_cache_hit_makes_no_request(servers, tmp_path):
+    server = servers()
+    providers = [fake_ip_providers.provider_for(server)]
+    cache_path = str(tmp_path / "ip.json")
+
+    first = grab_ip.lookup(providers, cache_path, ttl=300)
+    second = grab_ip.lookup(providers, cache_path, ttl=300)
+
+    assert server.hits == 1
+    assert second["ip"] == first["ip"]
+
+
+def test_expired_cache_is_refreshed(servers, tmp_path):
+    server = servers()
+    providers = [fake_ip_providers.provider_for(server)]
+    cache_path = str(tmp_path / "ip.json")
+
+    grab_ip.lookup(providers, cache_path, ttl=300)
+    grab_ip.lookup(providers, cache_path, ttl=0)
+
+    assert server.hits == 2
+
+
+def test_hook_runs_only_on_ip_or_asn_change(servers, tmp_path):
+    server = servers()
+    hook_log = tmp_path / "hook.log"
+    # Between polls: nothing changes, then the IP, then only the ASN
+    changes = [{}, {"ip": "203.0.113.8"}, {"asn": "AS64501"}]
+
+    def fake_sleep(_interval):
+        if not changes:
+            raise StopWatching
+        for key, value in changes.pop(0).items():
+            setattr(server, key, value)
+
+    with pytest.raises(StopWatching):
+        grab_ip.watch(
+            [fake_ip_providers.provider_for(server)],
+            interval=1,
+            hook=f'echo "$OLD_IP $OLD_ASN -> $IP $ASN" >> {hook_log}',
+            cache_path=None,
+            sleep=fake_sleep,
+        )
+
+    assert server.hits == 4
+    assert hook_log.read_text().splitlines() == [
+        "203.0.113.7 AS64500 -> 203.0.113.8 AS64500",
+        "203.0.113.8 AS64500 -> 203.0.113.8 AS64501",
+    ]
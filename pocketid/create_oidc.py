@@ -1,6 +1,14 @@
 """Script to update callback URLs for OIDC client en masse. OIDC Needs to exist before hand"""
 
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 DOMAIN = "domain.com"
 CLIENT_NAME = "your-oidc-client-name-here"
@@ -11,73 +19,252 @@ HEADERS = {
     "Accept": "application/json",
     "X-API-KEY": API_KEY,
 }
+PAGE_SIZE = 100
+PAGE_WORKERS = 4
+CALLBACK_PATH = "/caddy-security/oauth2/generic/authorization-code-callback"
+
+
+def load_services(path="services.txt"):
+    """Load services from a services.txt file (FileNotFoundError if missing)."""
+    with open(path, "r", encoding="utf-8") as file:
+        return [line.strip() for line in file if line.strip()]
+
+
+def build_callback_urls(services, domains):
+    """Callback URL for every service on every domain, grouped by domain."""
+    return [
+        f"https://{service}.{domain}{CALLBACK_PATH}"
+        for domain in domains
+        for service in services
+    ]
+
+
+def create_session(api_key, pool_size=PAGE_WORKERS, retries=3):
+    """Keep-alive session that retries failed and throttled calls with backoff."""
+    session = requests.Session()
+    session.headers.update({**HEADERS, "X-API-KEY": api_key})
+    retry = Retry(
+        total=retries,
+        backoff_factor=0.5,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=("GET", "PUT"),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def get_clients_page(session, base_url, page):
+    """Fetch one page of OIDC clients and return the decoded response."""
+    response = session.get(
+        f"{base_url}/api/oidc/clients",
+        params={"pagination[page]": page, "pagination[limit]": PAGE_SIZE},
+        timeout=60,
+    )
+    response.raise_for_status()
+    response_data = response.json()
+    if "data" not in response_data or not isinstance(response_data["data"], list):
+        raise ValueError(f"Unexpected API response structure: {response_data}")
+    return response_data
+
+
+def get_all_clients(session, base_url):
+    """Fetch every page of OIDC clients, the pages after the first concurrently."""
+    first_page = get_clients_page(session, base_url, 1)
+    total_pages = (first_page.get("pagination") or {}).get("totalPages") or 1
+
+    clients = list(first_page["data"])
+    with ThreadPoolExecutor(max_workers=PAGE_WORKERS) as executor:
+        pages = executor.map(
+            lambda page: get_clients_page(session, base_url, page),
+            range(2, total_pages + 1),
+        )
+        for page_data in pages:
+            clients.extend(page_data["data"])
+    return clients
+
+
+def index_clients(clients):
+    """Map client names to their client objects."""
+    return {client.get("name"): client for client in clients}
+
+
+def get_client_details(session, base_url, client):
+    """Return the full client, fetching it when the list view left fields out."""
+    if "callbackURLs" in client:
+        return client
+    response = session.get(f"{base_url}/api/oidc/clients/{client['id']}", timeout=60)
+    response.raise_for_status()
+    return response.json()
+
+
+def diff_callback_urls(current, desired):
+    """Return the (added, removed) URLs going from current to desired."""
+    current_set, desired_set = set(current), set(desired)
+    added = [url for url in desired if url not in current_set]
+    removed = [url for url in current if url not in desired_set]
+    return added, removed
+
+
+def update_client(session, base_url, client, callback_urls):
+    """PUT the client's callback URLs if they differ from the current ones.
 
+    Returns (added, removed, response), with response None when nothing changed.
+    """
+    details = get_client_details(session, base_url, client)
+    current = details.get("callbackURLs") or []
+    added, removed = diff_callback_urls(current, callback_urls)
+    if not added and not removed:
+        return added, removed, None
 
-def load_services():
-    """Load services from services.txt file."""
+    # The PUT replaces the client, so carry its other settings over unchanged
+    payload = {
+        "callbackURLs": callback_urls,
+        "name": client["name"],
+        "isPublic": details.get("isPublic", False),
+        "pkceEnabled": details.get("pkceEnabled", False),
+    }
+    response = session.put(
+        f"{base_url}/api/oidc/clients/{client['id']}", json=payload, timeout=60
+    )
+    return added, removed, response
+
+
+def sync_client(session, base_url, clients, entry):
+    """Bring one configured client's callback URLs in line with its services.
+
+    Returns a summary row for the batch table.
+    """
+    started = time.perf_counter()
+    row = {"client": entry["name"], "urls": 0, "added": 0, "removed": 0}
     try:
-        with open("services.txt", "r", encoding="utf-8") as file:
-            return [line.strip() for line in file if line.strip()]
+        services = load_services(entry.get("services_file", "services.txt"))
     except FileNotFoundError:
-        print("Error: services.txt file not found")
-        exit(1)
+        services = None
+    client = clients.get(entry["name"])
+    if services is None:
+        row["status"] = "error (services file missing)"
+    elif not client:
+        row["status"] = "not found"
+    else:
+        callback_urls = build_callback_urls(services, entry["domains"])
+        row["urls"] = len(callback_urls)
+        try:
+            added, removed, response = update_client(
+                session, base_url, client, callback_urls
+            )
+            row["added"], row["removed"] = len(added), len(removed)
+            if response is None:
+                row["status"] = "unchanged"
+            elif response.ok:
+                row["status"] = "updated"
+            else:
+                row["status"] = f"failed ({response.status_code})"
+        except (ValueError, requests.exceptions.RequestException) as e:
+            row["status"] = f"error ({e.__class__.__name__})"
+    row["seconds"] = time.perf_counter() - started
+    return row
 
 
-SERVICES = load_services()
+def print_summary(rows):
+    """Print one line per client with its URL counts and outcome."""
+    width = max([len("client")] + [len(row["client"]) for row in rows])
+    print(
+        f"{'client':<{width}} {'urls':>5} {'added':>6} {'removed':>8} "
+        f"{'time':>7}  status"
+    )
+    for row in rows:
+        print(
+            f"{row['client']:<{width}} {row['urls']:>5} {row['added']:>6} "
+            f"{row['removed']:>8} {row['seconds']:>6.2f}s  {row['status']}"
+        )
+
+
+def sync_all(config):
+    """Sync every client in a batch config concurrently and print a summary."""
+    base_url = config.get("base_url", POCKETID_BASE_URL)
+    api_key = os.environ.get("POCKETID_API_KEY") or config.get("api_key", API_KEY)
+    workers = config.get("workers", 4)
+    session = create_session(
+        api_key, max(workers, PAGE_WORKERS), config.get("retries", 3)
+    )
+
+    started = time.perf_counter()
+    try:
+        clients = index_clients(get_all_clients(session, base_url))
+    except (ValueError, requests.exceptions.RequestException) as e:
+        print(f"Failed to fetch OIDC clients: {e}")
+        exit(1)
+    print(f"Fetched {len(clients)} client(s)")
 
-CALLBACK_URLS = [
-    f"https://{service}.{DOMAIN}/caddy-security/oauth2/generic/authorization-code-callback"
-    for service in SERVICES
-]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        rows = list(
+            executor.map(
+                lambda entry: sync_client(session, base_url, clients, entry),
+                config["clients"],
+            )
+        )
+    print_summary(rows)
+    print(f"Synced {len(rows)} client(s) in {time.perf_counter() - started:.2f}s")
+    if any(row["status"] not in ("updated", "unchanged") for row in rows):
+        exit(1)
 
 
 def main():
     """Main function to get and update client information."""
-    response = requests.get(
-        f"{POCKETID_BASE_URL}/api/oidc/clients", headers=HEADERS, timeout=60
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "-c",
+        "--config",
+        help="JSON file mapping several clients to their domains and services "
+        "files; without it the single CLIENT_NAME/DOMAIN client is updated",
     )
-    print(f"Status: {response.status_code}")
+    args = parser.parse_args()
+    if args.config:
+        with open(args.config, "r", encoding="utf-8") as file:
+            sync_all(json.load(file))
+        return
 
     try:
-        response_data = response.json()
-
-        if "data" in response_data and isinstance(response_data["data"], list):
-            clients = response_data["data"]
-        else:
-            print(f"Unexpected API response structure: {response_data}")
-            exit(1)
+        callback_urls = build_callback_urls(load_services(), [DOMAIN])
+    except FileNotFoundError:
+        print("Error: services.txt file not found")
+        exit(1)
+    session = create_session(API_KEY)
 
-        client_id = None
-        for client in clients:
-            if client.get("name") == CLIENT_NAME:
-                client_id = client.get("id")
-                break
+    try:
+        clients = index_clients(get_all_clients(session, POCKETID_BASE_URL))
+        print(f"Fetched {len(clients)} client(s)")
 
-        if not client_id:
+        client = clients.get(CLIENT_NAME)
+        if not client:
             print(f"Could not find a client named '{CLIENT_NAME}'")
             exit(1)
 
-        print(f"Found client '{CLIENT_NAME}' with ID: {client_id}")
-
-        payload = {
-            "callbackURLs": CALLBACK_URLS,
-            "name": CLIENT_NAME,
-            "isPublic": False,
-            "pkceEnabled": False,
-        }
+        print(f"Found client '{CLIENT_NAME}' with ID: {client.get('id')}")
 
-        update_response = requests.put(
-            f"{POCKETID_BASE_URL}/api/oidc/clients/{client_id}",
-            headers=HEADERS,
-            json=payload,
-            timeout=60,
+        added, removed, update_response = update_client(
+            session, POCKETID_BASE_URL, client, callback_urls
         )
+        for url in added:
+            print(f"+ {url}")
+        for url in removed:
+            print(f"- {url}")
+
+        if update_response is None:
+            print("Callback URLs already up to date, nothing to update")
+            return
 
         print(f"Update Status: {update_response.status_code}")
         print(update_response.text)
 
-    except requests.exceptions.JSONDecodeError:
-        print("Failed to parse JSON response")
+    except ValueError as e:
+        # Includes requests.exceptions.JSONDecodeError
+        print(f"Failed to parse JSON response: {e}")
         exit(1)
     except requests.exceptions.RequestException as e:
         print(f"Request error: {e}")
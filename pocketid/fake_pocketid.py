@@ -0,0 +1,182 @@
+"""Local stand-in for the PocketID OIDC client API, for offline testing.
+
+Serves a paginated GET /api/oidc/clients, GET /api/oidc/clients/{id} and
+PUT /api/oidc/clients/{id}, checking the X-API-KEY header. Point
+create_oidc.py at it by setting POCKETID_BASE_URL to the printed address.
+"""
+
+import argparse
+import json
+import math
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+DEFAULT_API_KEY = "your-api-key-here"
+
+
+def make_clients(count, domain="domain.com"):
+    """Return `count` fake clients named client-0, client-1, ..."""
+    return {
+        f"id-{index}": {
+            "id": f"id-{index}",
+            "name": f"client-{index}",
+            "callbackURLs": [f"https://service{index}.{domain}/callback"],
+            "isPublic": False,
+            "pkceEnabled": False,
+        }
+        for index in range(count)
+    }
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    """Serve the OIDC client endpoints from the server's in-memory clients."""
+
+    server_version = "StandinPocketID/1.0"
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        """List clients page by page or return one client."""
+        if not self._authorised():
+            return
+        url = urlparse(self.path)
+        if url.path == "/api/oidc/clients":
+            self._list(parse_qs(url.query))
+        elif url.path.startswith("/api/oidc/clients/"):
+            client = self.server.clients.get(url.path.rsplit("/", 1)[1])
+            if client is None:
+                self._send(404, {"error": "client not found"})
+            else:
+                self._send(200, client)
+        else:
+            self._send(404, {"error": "not found"})
+
+    def do_PUT(self):  # pylint: disable=invalid-name
+        """Replace a client's settings and record the update."""
+        if not self._authorised():
+            return
+        url = urlparse(self.path)
+        client_id = url.path.rsplit("/", 1)[1]
+        client = self.server.clients.get(client_id)
+        if not url.path.startswith("/api/oidc/clients/") or client is None:
+            self._send(404, {"error": "client not found"})
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        with self.server.lock:
+            if self.server.fail_puts > 0:
+                self.server.fail_puts -= 1
+                self._send(503, {"error": "simulated failure"})
+                return
+            client.update(payload)
+            self.server.puts.append(client_id)
+        self._send(200, client)
+
+    def _list(self, query):
+        page = int(query.get("pagination[page]", ["1"])[0])
+        limit = int(query.get("pagination[limit]", ["20"])[0])
+        clients = list(self.server.clients.values())
+        # Like the real API, the list view leaves out callback URLs
+        data = [
+            {key: value for key, value in client.items() if key != "callbackURLs"}
+            for client in clients[(page - 1) * limit : page * limit]
+        ]
+        self._send(
+            200,
+            {
+                "data": data,
+                "pagination": {
+                    "totalPages": max(1, math.ceil(len(clients) / limit)),
+                    "totalItems": len(clients),
+                    "currentPage": page,
+                    "itemsPerPage": limit,
+                },
+            },
+        )
+
+    def _authorised(self):
+        if self.server.delay:
+            time.sleep(self.server.delay)
+        if self.headers.get("X-API-KEY") != self.server.api_key:
+            self._send(401, {"error": "invalid api key"})
+            return False
+        return True
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+def start_server(
+    host="127.0.0.1",
+    port=0,
+    clients=None,
+    api_key=DEFAULT_API_KEY,
+    delay=0.0,
+    fail_puts=0,
+    verbose=False,
+):
+    """Start the stand-in server on a background thread and return it.
+
+    Pass port=0 to pick a free port; the bound address is server.server_address.
+    `clients` maps client IDs to client dicts (default: 50 fake ones), the
+    first `fail_puts` PUTs are answered with HTTP 503 and the IDs of applied
+    PUTs are recorded in server.puts. Call server.shutdown() when done.
+    """
+    server = ThreadingHTTPServer((host, port), StandinHandler)
+    server.daemon_threads = True
+    server.clients = make_clients(50) if clients is None else clients
+    server.api_key = api_key
+    server.delay = delay
+    server.fail_puts = fail_puts
+    server.verbose = verbose
+    server.puts = []
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    """Run the stand-in server in the foreground."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument(
+        "--clients", type=int, default=50, help="Number of fake clients to serve"
+    )
+    parser.add_argument("--api-key", default=DEFAULT_API_KEY)
+    parser.add_argument(
+        "--delay", type=float, default=0.0, help="Seconds to wait before answering"
+    )
+    parser.add_argument(
+        "--fail-puts", type=int, default=0, help="Answer the first N PUTs with 503"
+    )
+    args = parser.parse_args()
+
+    server = start_server(
+        args.host,
+        args.port,
+        make_clients(args.clients),
+        args.api_key,
+        args.delay,
+        args.fail_puts,
+        verbose=True,
+    )
+    host, port = server.server_address[:2]
+    print(f"[*] Stand-in PocketID running on http://{host}:{port} (Ctrl+C to stop)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
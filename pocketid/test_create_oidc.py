@@ -0,0 +1,76 @@
+"""Tests for create_oidc.py against the local stand-in PocketID server."""
+
+import pytest
+
+import create_oidc
+import fake_pocketid
+
+
+@pytest.fixture
+def server():
+    """A stand-in server with 250 clients, so listing needs three pages."""
+    server = fake_pocketid.start_server(
+        port=0, clients=fake_pocketid.make_clients(250)
+    )
+    yield server
+    server.shutdown()
+
+
+@pytest.fixture
+def base_url(server):
+    host, port = server.server_address[:2]
+    return f"http://{host}:{port}"
+
+
+@pytest.fixture
+def session():
+    session = create_oidc.create_session(fake_pocketid.DEFAULT_API_KEY, retries=0)
+    yield session
+    session.close()
+
+
+def test_get_all_clients_fetches_every_page(server, base_url, session):
+    clients = create_oidc.get_all_clients(session, base_url)
+
+    assert create_oidc.PAGE_SIZE < len(server.clients)
+    assert sorted(client["id"] for client in clients) == sorted(server.clients)
+
+
+def test_update_client_skips_put_when_urls_match(server, base_url, session):
+    client = server.clients["id-3"]
+    # Same set in a different order
+    desired = list(reversed(client["callbackURLs"] + ["https://extra/callback"]))
+    client["callbackURLs"].append("https://extra/callback")
+
+    added, removed, response = create_oidc.update_client(
+        session, base_url, {"id": "id-3", "name": "client-3"}, desired
+    )
+
+    assert (added, removed, response) == ([], [], None)
+    assert server.puts == []
+
+
+def test_update_client_reports_added_and_removed_urls(server, base_url, session):
+    old_url = server.clients["id-7"]["callbackURLs"][0]
+    desired = ["https://a.example.com/callback", "https://b.example.com/callback"]
+
+    added, removed, response = create_oidc.update_client(
+        session, base_url, {"id": "id-7", "name": "client-7"}, desired
+    )
+
+    assert added == desired
+    assert removed == [old_url]
+    assert response.ok
+    assert server.puts == ["id-7"]
+    assert server.clients["id-7"]["callbackURLs"] == desired
+
+
+def test_update_client_keeps_client_flags(server, base_url, session):
+    server.clients["id-1"].update(isPublic=True, pkceEnabled=True)
+
+    create_oidc.update_client(
+        session, base_url, {"id": "id-1", "name": "client-1"}, ["https://new/cb"]
+    )
+
+    assert server.clients["id-1"]["isPublic"] is True
+    assert server.clients["id-1"]["pkceEnabled"] is True
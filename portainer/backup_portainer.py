@@ -0,0 +1,226 @@
+"""Script to download a Portainer backup with checksums and snapshot rotation"""
+
+import argparse
+import hashlib
+import logging
+import os
+import time
+
+import requests
+
+from export_portainer_stacks import (
+    API_STATS,
+    add_auth_arguments,
+    api_call,
+    auth_from_args,
+)
+
+logger = logging.getLogger(__name__)
+
+BACKUP_DIR = "backups"
+SNAPSHOT_PREFIX = "portainer_snapshot-"
+SNAPSHOT_SUFFIX = ".tar.gz"
+# Always points at the newest snapshot, for jobs that expect one fixed file
+LATEST_NAME = "portainer_snapshot.tar.gz"
+CHUNK_SIZE = 1024 * 1024
+
+
+class IncompleteDownload(IOError):
+    """The response ended before the advertised number of bytes arrived"""
+
+
+# Errors that mean the transfer broke off and is worth resuming or retrying
+TRANSFER_ERRORS = (
+    requests.exceptions.ConnectionError,
+    requests.exceptions.Timeout,
+    requests.exceptions.ChunkedEncodingError,
+    IncompleteDownload,
+)
+
+
+def is_transient(error):
+    """Whether a failed download is worth retrying
+
+    Broken connections, timeouts, short bodies and 5xx responses are; 4xx
+    responses such as a wrong backup password or missing permissions are not.
+    """
+    if isinstance(error, requests.exceptions.HTTPError):
+        return error.response is not None and error.response.status_code >= 500
+    return isinstance(error, TRANSFER_ERRORS)
+
+
+def snapshot_name(timestamp=None):
+    """File name of a snapshot taken at timestamp (default: now)"""
+    stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(timestamp))
+    return f"{SNAPSHOT_PREFIX}{stamp}{SNAPSHOT_SUFFIX}"
+
+
+def request_backup(auth, password, headers=None):
+    """Ask Portainer for a backup and return the unread streaming response"""
+    return api_call(
+        "POST",
+        "/api/backup",
+        "/api/backup",
+        auth,
+        json={"password": password},
+        headers=headers or {},
+        stream=True,
+    )
+
+
+def download_backup(auth, dest_path, password="", retries=3, backoff=2.0):
+    """Stream a backup to dest_path via a .part file and return its sha256
+
+    The body is written and hashed CHUNK_SIZE bytes at a time, so memory use
+    does not depend on the snapshot size. A broken transfer is resumed with a
+    Range request when the server offered a validator (ETag or Last-Modified)
+    and honours it, and is otherwise restarted from scratch.
+    """
+    part_path = f"{dest_path}.part"
+    hasher = hashlib.sha256()
+    received = 0
+    validator = None
+
+    for attempt in range(1, retries + 2):
+        headers = {}
+        if received and validator:
+            headers = {"Range": f"bytes={received}-", "If-Range": validator}
+        try:
+            resp = request_backup(auth, password, headers)
+            if resp.status_code == 206 and resp.headers.get(
+                "Content-Range", ""
+            ).startswith(f"bytes {received}-"):
+                logger.info("Resuming backup download at %d bytes", received)
+                mode = "ab"
+            else:
+                resp.raise_for_status()
+                hasher, received, mode = hashlib.sha256(), 0, "wb"
+                validator = resp.headers.get("ETag") or resp.headers.get(
+                    "Last-Modified"
+                )
+            expected = resp.headers.get("Content-Length")
+            expected = received + int(expected) if expected is not None else None
+
+            with resp, open(part_path, mode) as f:
+                for chunk in resp.iter_content(CHUNK_SIZE):
+                    f.write(chunk)
+                    hasher.update(chunk)
+                    received += len(chunk)
+                if expected is not None and received != expected:
+                    raise IncompleteDownload(f"got {received} of {expected} bytes")
+                f.flush()
+                os.fsync(f.fileno())
+            break
+        except (requests.exceptions.RequestException, IncompleteDownload) as e:
+            if attempt > retries or not is_transient(e):
+                if os.path.exists(part_path):
+                    os.remove(part_path)
+                raise
+            logger.warning(
+                "Backup download interrupted (%s), retrying in %.0fs (%d/%d)",
+                e,
+                backoff * attempt,
+                attempt,
+                retries,
+            )
+            time.sleep(backoff * attempt)
+
+    os.replace(part_path, dest_path)
+    return hasher.hexdigest(), received
+
+
+def write_checksum(path, digest):
+    """Write a sha256sum-compatible checksum file next to path"""
+    with open(f"{path}.sha256", "w", encoding="utf-8") as f:
+        f.write(f"{digest}  {os.path.basename(path)}\n")
+
+
+def update_latest(backup_dir, snapshot_path):
+    """Atomically point LATEST_NAME at the newest snapshot with a hard link"""
+    latest_path = os.path.join(backup_dir, LATEST_NAME)
+    tmp_path = f"{latest_path}.tmp"
+    try:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        os.link(snapshot_path, tmp_path)
+        os.replace(tmp_path, latest_path)
+    except OSError as e:
+        logger.warning("Could not update %s: %s", latest_path, e)
+
+
+def rotate_snapshots(backup_dir, keep):
+    """Delete all but the newest `keep` snapshots and return the removed names"""
+    snapshots = sorted(
+        name
+        for name in os.listdir(backup_dir)
+        if name.startswith(SNAPSHOT_PREFIX) and name.endswith(SNAPSHOT_SUFFIX)
+    )
+    removed = snapshots[:-keep] if keep > 0 else []
+    for name in removed:
+        path = os.path.join(backup_dir, name)
+        os.remove(path)
+        if os.path.exists(f"{path}.sha256"):
+            os.remove(f"{path}.sha256")
+        logger.info("Removed old snapshot %s", name)
+    return removed
+
+
+def main():
+    """Download one backup snapshot, verify it and rotate old ones"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    add_auth_arguments(parser)
+    parser.add_argument(
+        "-o",
+        "--output-dir",
+        default=BACKUP_DIR,
+        help=f"Directory for snapshots (default: {BACKUP_DIR})",
+    )
+    parser.add_argument(
+        "--keep",
+        type=int,
+        default=7,
+        help="Number of snapshots to keep, 0 keeps all (default: 7)",
+    )
+    parser.add_argument(
+        "--retries",
+        type=int,
+        default=3,
+        help="Times to resume or retry an interrupted download (default: 3)",
+    )
+    parser.add_argument(
+        "--backup-password",
+        default="",
+        help="Password Portainer encrypts the backup with (default: none)",
+    )
+    args = parser.parse_args()
+    auth = auth_from_args(parser, args)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    snapshot_path = os.path.join(args.output_dir, snapshot_name())
+    logger.info("Downloading Portainer backup to %s", snapshot_path)
+    started = time.perf_counter()
+    digest, size = download_backup(
+        auth, snapshot_path, args.backup_password, args.retries
+    )
+    elapsed = time.perf_counter() - started
+    write_checksum(snapshot_path, digest)
+    update_latest(args.output_dir, snapshot_path)
+    logger.info(
+        "Saved %s: %.1f MB in %.1fs (%.1f MB/s), sha256 %s",
+        snapshot_path,
+        size / 1e6,
+        elapsed,
+        size / 1e6 / elapsed if elapsed else 0,
+        digest,
+    )
+
+    removed = rotate_snapshots(args.output_dir, args.keep)
+    logger.info("Removed %d old snapshot(s)", len(removed))
+
+    logger.info("API call summary:")
+    API_STATS.log_summary()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,100 +1,205 @@
 """Script to move all compose variables into stack.env for tidyness"""
 
+import argparse
+import contextlib
+import io
 import os
-import subprocess
+from concurrent.futures import ProcessPoolExecutor
 
 import yaml
 
+import yaml_io
+
 STACKS_DIR = "homelab-stacks"
 
 
-def fix_yaml_tabs():
-    """First ensure all tabs are fixed in compose files"""
-    print("[*] Fixing tabs in docker-compose.yml files...")
+def fix_yaml_tabs(content):
+    """Replace tabs with spaces so the compose file parses as YAML"""
+    return content.replace("\t", "  ")
+
+
+def parse_env(content):
+    """Parse stack.env content into an ordered dict"""
+    env = {}
+    for line in content.splitlines():
+        if "=" in line and not line.startswith("#"):
+            key, value = line.strip().split("=", 1)
+            env[key] = value
+    return env
+
+
+def render_env(env):
+    """Render env vars as sorted KEY=value lines"""
+    return "".join(f"{key}={env[key]}\n" for key in sorted(env.keys()))
+
+
+def move_environment_to_env_file(compose, merged_env):
+    """Merge each service's environment into merged_env and point it at stack.env
+
+    Modifies compose and merged_env in place and returns the cleaned service names.
+    """
+    cleaned = []
+    services = compose.get("services") or {}
+    for service_name, service_def in services.items():
+        env_list = service_def.get("environment")
+        if not env_list:
+            continue
+
+        # Merge in new environment variables from docker-compose.yml
+        for item in env_list:
+            if isinstance(item, str) and "=" in item:
+                key, value = item.split("=", 1)
+                merged_env[key.strip()] = value.strip()
+            elif isinstance(item, dict):
+                for k, v in item.items():
+                    merged_env[k.strip()] = str(v).strip()
+
+        # Replace environment block with env_file reference
+        service_def.pop("environment")
+        service_def["env_file"] = ["stack.env"]
+        cleaned.append(service_name)
+    return cleaned
+
+
+def read_text(path):
+    """Return a file's text, or None if it does not exist"""
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def write_atomic(path, content):
+    """Write via a temp file and rename so readers never see a partial file"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+def tidy_stack(stack_name, stack_path, dry_run=False):
+    """Tidy one stack in a single pass, writing only files whose content changed
+
+    Returns a dict of what changed, or None if the stack was skipped.
+    """
+    compose_file = os.path.join(stack_path, "docker-compose.yml")
+    env_file = os.path.join(stack_path, "stack.env")
+
+    original = read_text(compose_file)
+    if original is None:
+        return None
+
+    content = fix_yaml_tabs(original)
     try:
-        subprocess.run(
-            [
-                "find",
-                STACKS_DIR,
-                "-name",
-                "docker-compose.yml",
-                "-exec",
-                "sed",
-                "-i",
-                "s/\t/  /g",
-                "{}",
-                "+",
-            ],
-            check=True,
+        compose = yaml_io.safe_load(content) or {}
+    except yaml.YAMLError as e:
+        print(f"[!] Skipping {stack_name}: invalid YAML ({e})")
+        return None
+
+    # Load existing stack.env file (if exists)
+    original_env = read_text(env_file)
+    merged_env = parse_env(original_env) if original_env is not None else {}
+
+    cleaned = move_environment_to_env_file(compose, merged_env)
+    for service_name in cleaned:
+        print(f"[+] Cleaned up {stack_name}/{service_name}")
+
+    new_env = original_env
+    if cleaned:
+        new_env = render_env(merged_env)
+        content = yaml_io.dump(compose)
+
+    changes = {
+        "tabs": "\t" in original,
+        "services": len(cleaned),
+        "env": new_env != original_env,
+        "compose": content != original,
+    }
+
+    if changes["env"]:
+        if not dry_run:
+            write_atomic(env_file, new_env)
+        print(
+            f"[+] Merged stack.env {'would be ' if dry_run else ''}written to {env_file}"
         )
-        print("[✓] Tabs replaced with spaces in all compose files")
-    except subprocess.CalledProcessError as e:
-        print("[!] Error while fixing tabs:", e)
+    if changes["compose"]:
+        if not dry_run:
+            write_atomic(compose_file, content)
+        print(f"[✓] {'Would update' if dry_run else 'Updated'}: {compose_file}")
+    return changes
+
+
+def tidy_stack_captured(stack_name, dry_run=False):
+    """Worker entry point: tidy a stack and return its changes and printed output"""
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        changes = tidy_stack(stack_name, os.path.join(STACKS_DIR, stack_name), dry_run)
+    return changes, output.getvalue()
+
+
+def tidy_stacks(stack_names, dry_run=False, jobs=1):
+    """Yield each stack's changes in order, tidying in `jobs` worker processes
+
+    Each worker's output is printed as one block when its stack is done, so
+    messages from different stacks never interleave.
+    """
+    if jobs <= 1:
+        for stack_name in stack_names:
+            yield tidy_stack(stack_name, os.path.join(STACKS_DIR, stack_name), dry_run)
+        return
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        results = executor.map(
+            tidy_stack_captured, stack_names, [dry_run] * len(stack_names)
+        )
+        for changes, output in results:
+            print(output, end="")
+            yield changes
 
 
-def tidy_stack_envs():
+def tidy_stack_envs(dry_run=False, jobs=1):
     """Loop through all stacks and create stack.env files and update compose to use stack.env"""
-    fix_yaml_tabs()  # Run tab fix before parsing anything
-
-    for stack_name in os.listdir(STACKS_DIR):
-        stack_path = os.path.join(STACKS_DIR, stack_name)
-        compose_file = os.path.join(stack_path, "docker-compose.yml")
-        env_file = os.path.join(stack_path, "stack.env")
+    totals = {"stacks": 0, "tabs": 0, "services": 0, "env": 0, "compose": 0}
 
-        if not os.path.isfile(compose_file):
+    for changes in tidy_stacks(sorted(os.listdir(STACKS_DIR)), dry_run, jobs):
+        if changes is None:
             continue
 
-        with open(compose_file, "r", encoding="utf-8") as f:
-            try:
-                compose = yaml.safe_load(f)
-            except yaml.YAMLError as e:
-                print(f"[!] Skipping {stack_name}: invalid YAML ({e})")
-                continue
-
-        services = compose.get("services", {})
-        updated = False
-        merged_env = {}
-
-        # Step 1: Load existing stack.env file (if exists)
-        if os.path.exists(env_file):
-            with open(env_file, "r", encoding="utf-8") as f:
-                for line in f:
-                    if "=" in line and not line.startswith("#"):
-                        key, value = line.strip().split("=", 1)
-                        merged_env[key] = value
-
-        for service_name, service_def in services.items():
-            env_list = service_def.get("environment")
-            if not env_list:
-                continue
-
-            # Step 2: Merge in new environment variables from docker-compose.yml
-            for item in env_list:
-                if isinstance(item, str) and "=" in item:
-                    key, value = item.split("=", 1)
-                    merged_env[key.strip()] = value.strip()
-                elif isinstance(item, dict):
-                    for k, v in item.items():
-                        merged_env[k.strip()] = str(v).strip()
-
-            # Step 3: Replace environment block with env_file reference
-            service_def.pop("environment")
-            service_def["env_file"] = ["stack.env"]
-            updated = True
-            print(f"[+] Cleaned up {stack_name}/{service_name}")
-
-        # Step 4: Write merged stack.env file
-        if updated:
-            with open(env_file, "w", encoding="utf-8") as f:
-                for key in sorted(merged_env.keys()):
-                    f.write(f"{key}={merged_env[key]}\n")
-            print(f"[+] Merged stack.env written to {env_file}")
-
-            # Step 5: Update docker-compose.yml
-            with open(compose_file, "w", encoding="utf-8") as f:
-                yaml.dump(compose, f, sort_keys=False)
-                print(f"[✓] Updated: {compose_file}")
+        totals["stacks"] += 1
+        for key in ("tabs", "env", "compose"):
+            totals[key] += int(changes[key])
+        totals["services"] += changes["services"]
+
+    prefix = "[dry-run] Would change" if dry_run else "[✓] Changed"
+    print(
+        f"{prefix}: {totals['compose']} compose file(s) "
+        f"({totals['tabs']} with tabs, {totals['services']} service(s) cleaned) and "
+        f"{totals['env']} stack.env file(s) across {totals['stacks']} stack(s)"
+    )
+    return totals
+
+
+def main():
+    """Parse arguments and tidy every stack"""
+    parser = argparse.ArgumentParser(
+        description="Move compose environment variables into stack.env files."
+    )
+    parser.add_argument(
+        "-n",
+        "--dry-run",
+        action="store_true",
+        help="Report what would change without writing anything",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="Number of stacks to tidy in parallel worker processes",
+    )
+    args = parser.parse_args()
+    tidy_stack_envs(dry_run=args.dry_run, jobs=args.jobs)
 
 
 if __name__ == "__main__":
-    tidy_stack_envs()
+    main()
@@ -1,153 +1,558 @@
 """Script to export all Portainer stacks into a local structured directory"""
 
 import argparse
+import hashlib
 import json  # for pretty-printing debug output
+import logging
 import os
-from getpass import getpass
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 import requests
+from requests.adapters import HTTPAdapter
+
+from portainer_auth import TOKEN_CACHE_PATH, PortainerAuth
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
 
 PORTAINER_URL = "redacted"
 OUTPUT_DIR = "homelab-stacks"
+MANIFEST_FILE = ".export-manifest.json"
+
+# Shared keep-alive session so every API call reuses the same TLS connections
+SESSION = requests.Session()
+
+
+class ApiStats:
+    """Thread-safe record of latency, bytes and status for every API call"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = {}
+
+    def record(self, endpoint, seconds, size, status):
+        """Store one call against its endpoint template"""
+        with self._lock:
+            self.calls.setdefault(endpoint, []).append((seconds, size, status))
+
+    def summary(self):
+        """Per-endpoint call counts, statuses, bytes and latency percentiles"""
+        result = {}
+        with self._lock:
+            calls = {endpoint: list(items) for endpoint, items in self.calls.items()}
+        for endpoint, items in calls.items():
+            latencies = sorted(seconds for seconds, _, _ in items)
+            statuses = {}
+            for _, _, status in items:
+                statuses[str(status)] = statuses.get(str(status), 0) + 1
+            result[endpoint] = {
+                "calls": len(items),
+                "statuses": statuses,
+                "bytes": sum(size for _, size, _ in items),
+                "total_ms": round(sum(latencies) * 1000, 1),
+                "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+                "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+                "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+                "max_ms": round(latencies[-1] * 1000, 1),
+            }
+        return result
+
+    def log_summary(self):
+        """Log one line per endpoint"""
+        for endpoint, stats in sorted(self.summary().items()):
+            statuses = ", ".join(
+                f"{status}x{count}"
+                for status, count in sorted(stats["statuses"].items())
+            )
+            logger.info(
+                "%-24s %4d calls  %9d bytes  p50 %7.1f ms  p95 %7.1f ms  "
+                "p99 %7.1f ms  max %7.1f ms  [%s]",
+                endpoint,
+                stats["calls"],
+                stats["bytes"],
+                stats["p50_ms"],
+                stats["p95_ms"],
+                stats["p99_ms"],
+                stats["max_ms"],
+                statuses,
+            )
+
+    def write(self, path):
+        """Write the summary as JSON"""
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.summary(), f, indent=2, sort_keys=True)
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    index = max(
+        0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values)) - 1)
+    )
+    return sorted_values[index]
+
+
+API_STATS = ApiStats()
+
+
+def configure_pool(pool_size):
+    """Size the session's connection pool for the number of export workers"""
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    SESSION.mount("https://", adapter)
+    SESSION.mount("http://", adapter)
+
+
+def api_call(method, endpoint, path, auth=None, **kwargs):
+    """Send a Portainer API request, recording its latency, size and status
+
+    `endpoint` is the templated path (e.g. /api/stacks/{id}) used to group stats.
+    With `auth`, its headers are sent and a 401 triggers one re-login and retry.
+    """
+    if auth is None:
+        return _timed_request(method, endpoint, path, **kwargs)
+
+    extra_headers = kwargs.pop("headers", {})
+    headers = {**extra_headers, **auth.headers()}
+    resp = _timed_request(method, endpoint, path, headers=headers, **kwargs)
+    if resp.status_code == 401 and auth.can_refresh:
+        resp.close()
+        auth.refresh(headers)
+        headers = {**extra_headers, **auth.headers()}
+        resp = _timed_request(method, endpoint, path, headers=headers, **kwargs)
+    return resp
+
+
+def _timed_request(method, endpoint, path, **kwargs):
+    started = time.perf_counter()
+    try:
+        resp = SESSION.request(
+            method, f"{PORTAINER_URL}{path}", verify=False, timeout=60, **kwargs
+        )
+    except requests.RequestException:
+        API_STATS.record(endpoint, time.perf_counter() - started, 0, "error")
+        raise
+    # Streamed bodies are read by the caller, so only the advertised size is known
+    if kwargs.get("stream"):
+        size = int(resp.headers.get("Content-Length", 0))
+    else:
+        size = len(resp.content)
+    API_STATS.record(endpoint, time.perf_counter() - started, size, resp.status_code)
+    return resp
 
 
 def login(username, password):
     """Function to get portainer jwt"""
-    print("[+] Authenticating to Portainer...")
-    resp = requests.post(
-        f"{PORTAINER_URL}/api/auth",
+    logger.info("Authenticating to Portainer...")
+    resp = api_call(
+        "POST",
+        "/api/auth",
+        "/api/auth",
         json={"Username": username, "Password": password},
-        verify=False,
-        timeout=60,
     )
     resp.raise_for_status()
     return resp.json()["jwt"]
 
 
-def get_stacks(token):
+def get_stacks(auth):
     """Fetch all stacks"""
-    print("[+] Fetching stacks...")
-    headers = {"Authorization": f"Bearer {token}"}
-    resp = requests.get(
-        f"{PORTAINER_URL}/api/stacks", headers=headers, verify=False, timeout=60
-    )
+    logger.info("Fetching stacks...")
+    resp = api_call("GET", "/api/stacks", "/api/stacks", auth)
     resp.raise_for_status()
     return resp.json()
 
 
-def get_stack_detail(token, stack_id):
+def get_stack_detail(auth, stack_id):
     """Loop over all stacks to get stack details"""
-
-    headers = {"Authorization": f"Bearer {token}"}
-    resp = requests.get(
-        f"{PORTAINER_URL}/api/stacks/{stack_id}",
-        headers=headers,
-        verify=False,
-        timeout=60,
-    )
+    resp = api_call("GET", "/api/stacks/{id}", f"/api/stacks/{stack_id}", auth)
     resp.raise_for_status()
     return resp.json()
 
 
-def get_stack_file(token, stack_id):
+def get_stack_file(auth, stack_id):
     """Get each stack yaml file"""
-    headers = {"Authorization": f"Bearer {token}"}
-    resp = requests.get(
-        f"{PORTAINER_URL}/api/stacks/{stack_id}/file",
-        headers=headers,
-        verify=False,
-        timeout=60,
+    resp = api_call(
+        "GET", "/api/stacks/{id}/file", f"/api/stacks/{stack_id}/file", auth
     )
     if resp.status_code == 200:
         return resp.text
     else:
-        print(f"[!] Failed to fetch /file for stack {stack_id}: {resp.status_code}")
+        logger.warning(
+            "Failed to fetch /file for stack %s: %s", stack_id, resp.status_code
+        )
         return None
 
 
+def stack_dir_name(stack_name):
+    """Directory name used for a stack under OUTPUT_DIR"""
+    return stack_name.replace(" ", "_")
+
+
+def write_if_changed(path, content):
+    """Atomically write content unless the file already holds the same bytes.
+
+    Returns (sha256 hex digest, whether the file was written).
+    """
+    data = content.encode("utf-8")
+    digest = hashlib.sha256(data).hexdigest()
+    if os.path.exists(path):
+        with open(path, "rb") as f:
+            if hashlib.sha256(f.read()).hexdigest() == digest:
+                return digest, False
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    return digest, True
+
+
 def save_stack(stack_name, stack_content):
     """Save each stack locally to its respective directory"""
-    safe_name = stack_name.replace(" ", "_")
-    path = os.path.join(OUTPUT_DIR, safe_name)
+    path = os.path.join(OUTPUT_DIR, stack_dir_name(stack_name))
     os.makedirs(path, exist_ok=True)
 
-    print(f"[DEBUG] Saving to file for {stack_name} (type={type(stack_content)}):")
-    print(stack_content[:200])  # preview first 200 characters
+    logger.debug(
+        "Saving compose file for %s, preview:\n%s", stack_name, stack_content[:200]
+    )
 
     compose_file_path = os.path.join(path, "docker-compose.yml")
-    with open(compose_file_path, "w", encoding="utf-8") as f:
-        f.write(stack_content)
+    digest, written = write_if_changed(compose_file_path, stack_content)
 
-    print(f"[+] Saved {stack_name} to {compose_file_path}")
+    if written:
+        logger.info("Saved %s to %s", stack_name, compose_file_path)
+    else:
+        logger.info("%s unchanged", compose_file_path)
+    return digest, written
 
 
-def save_env_file(stack_name, env_vars):
-    """If Stack also contains an existing .env file, save this as stack.env in the same directory"""
+def render_env_vars(env_vars):
+    """Render a stack's Env list as stack.env content, or None if it has none"""
     if not env_vars:
-        return  # No environment variables to save
+        return None
+    lines = []
+    for item in env_vars:
+        name = item.get("name")
+        value = item.get("value", "")
+        if name:
+            lines.append(f"{name}={value}\n")
+    return "".join(lines)
+
+
+def save_env_file(stack_name, env_content):
+    """If Stack also contains an existing .env file, save this as stack.env in the same directory"""
+    if env_content is None:
+        return None, False  # No environment variables to save
 
-    safe_name = stack_name.replace(" ", "_")
-    path = os.path.join(OUTPUT_DIR, safe_name)
+    path = os.path.join(OUTPUT_DIR, stack_dir_name(stack_name))
     os.makedirs(path, exist_ok=True)
 
     env_path = os.path.join(path, "stack.env")
-    with open(env_path, "w", encoding="utf-8") as f:
-        for item in env_vars:
-            name = item.get("name")
-            value = item.get("value", "")
-            if name:
-                f.write(f"{name}={value}\n")
+    digest, written = write_if_changed(env_path, env_content)
 
-    print(f"[+] Saved stack.env file for {stack_name} to {env_path}")
+    if written:
+        logger.info("Saved stack.env file for %s to %s", stack_name, env_path)
+    else:
+        logger.info("%s unchanged", env_path)
+    return digest, written
 
 
-def main():
-    """Main function"""
-    parser = argparse.ArgumentParser(
-        description="Export Portainer stacks to Docker Compose files."
+def load_manifest():
+    """Load the manifest of previously exported stacks, keyed by stack ID"""
+    manifest_path = os.path.join(OUTPUT_DIR, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_manifest(manifest):
+    """Atomically write the export manifest"""
+    write_if_changed(
+        os.path.join(OUTPUT_DIR, MANIFEST_FILE),
+        json.dumps(manifest, indent=2, sort_keys=True) + "\n",
     )
-    parser.add_argument("-u", "--username", required=True, help="Portainer username")
+
+
+def stack_version(stack):
+    """Values Portainer bumps whenever a stack is edited"""
+    return [stack.get("UpdateDate"), stack.get("UpdatedBy")]
+
+
+def transform_name(transform):
+    """Name recorded in the manifest for the transform a stack was exported with"""
+    return transform.__name__ if transform else None
+
+
+def is_unchanged(stack, entry, transform=None):
+    """True if the manifest entry matches the stack and its files are still on disk
+
+    An entry written with a different transform (or none) counts as changed, so
+    switching between the exporter and the pipeline rewrites every stack.
+    """
+    if not entry or entry["version"] != stack_version(stack):
+        return False
+    if entry.get("transform") != transform_name(transform):
+        return False
+    if entry["dir"] != stack_dir_name(stack["Name"]):
+        return False
+    path = os.path.join(OUTPUT_DIR, entry["dir"])
+    return all(os.path.exists(os.path.join(path, name)) for name in entry["files"])
+
+
+def fetch_stack(auth, stack):
+    """Fetch a stack's compose file and stack.env content from Portainer
+
+    Either may be None if the stack has no file content or no Env.
+    """
+    details = get_stack_detail(auth, stack["Id"])
+    # Formatting large Env blocks is costly, so only do it when it will be shown
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Stack Detail JSON:\n%s", json.dumps(details, indent=2))
+    env_content = render_env_vars(details.get("Env", []))
+
+    # Try to get the actual file from /api/stacks/{id}/file
+    stack_content = get_stack_file(auth, stack["Id"])
+
+    # Check if content is accidentally JSON-wrapped
+    try:
+        parsed = json.loads(stack_content)
+        if isinstance(parsed, dict) and "StackFileContent" in parsed:
+            logger.debug(
+                "Extracting YAML from JSON-wrapped response for %s", stack["Name"]
+            )
+            stack_content = parsed["StackFileContent"]
+    except (json.JSONDecodeError, TypeError):
+        pass  # It's raw YAML
+
+    return stack_content, env_content
+
+
+def export_stack(auth, stack, entry=None, incremental=False, transform=None):
+    """Fetch one stack's details and compose file and save them locally
+
+    `transform(stack_name, compose, env)` may rewrite both contents in memory
+    before anything is written. Returns (status, manifest entry) where status
+    is added, changed or unchanged.
+    """
+    logger.debug("Stack Summary: %s (ID: %s)", stack["Name"], stack["Id"])
+
+    if incremental and is_unchanged(stack, entry, transform):
+        logger.info("%s not modified since last export, skipping", stack["Name"])
+        return "unchanged", entry
+
+    stack_content, env_content = fetch_stack(auth, stack)
+    if transform and stack_content:
+        stack_content, env_content = transform(
+            stack["Name"], stack_content, env_content
+        )
+
+    files = {}
+    env_digest, env_written = save_env_file(stack["Name"], env_content)
+    if env_digest:
+        files["stack.env"] = env_digest
+
+    compose_written = False
+    version = stack_version(stack)
+    if stack_content:
+        files["docker-compose.yml"], compose_written = save_stack(
+            stack["Name"], stack_content
+        )
+    else:
+        logger.warning("Skipping %s (no file content returned)", stack["Name"])
+        # No version, so the next incremental run fetches it again
+        version = None
+
+    if entry is None:
+        status = "added"
+    elif env_written or compose_written:
+        status = "changed"
+    else:
+        status = "unchanged"
+
+    new_entry = {
+        "name": stack["Name"],
+        "dir": stack_dir_name(stack["Name"]),
+        "version": version,
+        "transform": transform_name(transform),
+        "files": files,
+    }
+    return status, new_entry
+
+
+def export_stack_group(auth, stacks, manifest, incremental, transform=None):
+    """Export stacks that share an output directory in their original order"""
+    return [
+        (
+            stack,
+            *export_stack(
+                auth, stack, manifest.get(str(stack["Id"])), incremental, transform
+            ),
+        )
+        for stack in stacks
+    ]
+
+
+def export_all(auth, stacks, manifest, incremental, workers, transform=None):
+    """Export every stack, concurrently when workers > 1
+
+    Yields (stack, status, manifest entry) as each stack finishes.
+    """
+    if workers <= 1:
+        for stack in stacks:
+            yield from export_stack_group(
+                auth, [stack], manifest, incremental, transform
+            )
+        return
+
+    configure_pool(workers)
+
+    # Stacks whose names map to the same directory stay on one worker, in API
+    # order, so the last one written wins exactly as in a serial run
+    groups = {}
+    for stack in stacks:
+        groups.setdefault(stack_dir_name(stack["Name"]), []).append(stack)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(
+                export_stack_group, auth, group, manifest, incremental, transform
+            )
+            for group in groups.values()
+        ]
+        for future in as_completed(futures):
+            yield from future.result()
+
+
+def remove_stale_stacks(manifest, stacks):
+    """Delete directories of stacks that no longer exist in Portainer"""
+    current_ids = {str(stack["Id"]) for stack in stacks}
+    current_dirs = {stack_dir_name(stack["Name"]) for stack in stacks}
+    removed = 0
+    for stack_id in sorted(set(manifest) - current_ids):
+        entry = manifest.pop(stack_id)
+        removed += 1
+        path = os.path.join(OUTPUT_DIR, entry["dir"])
+        if entry["dir"] not in current_dirs and os.path.isdir(path):
+            shutil.rmtree(path)
+            logger.info("Removed %s (%s), no longer in Portainer", entry["name"], path)
+    return removed
+
+
+def add_auth_arguments(parser):
+    """Add the Portainer login, API key and token cache options"""
+    parser.add_argument("-u", "--username", help="Portainer username")
     parser.add_argument(
         "-p",
         "--password",
         help="Portainer password (if not provided, will prompt securely)",
     )
-    args = parser.parse_args()
+    parser.add_argument(
+        "-k",
+        "--api-key",
+        default=os.environ.get("PORTAINER_API_KEY"),
+        help="Portainer API key to use instead of a login "
+        "(default: $PORTAINER_API_KEY)",
+    )
+    parser.add_argument(
+        "--token-cache",
+        default=TOKEN_CACHE_PATH,
+        help=f"JWT cache file (default: {TOKEN_CACHE_PATH})",
+    )
+    parser.add_argument(
+        "--no-token-cache",
+        action="store_true",
+        help="Always log in and never store the JWT on disk",
+    )
+
+
+def auth_from_args(parser, args):
+    """Build a PortainerAuth from the options added by add_auth_arguments"""
+    if not args.api_key and not args.username:
+        parser.error("either --username or --api-key is required")
+    return PortainerAuth(
+        login,
+        PORTAINER_URL,
+        username=args.username,
+        password=args.password,
+        api_key=args.api_key,
+        cache_path=None if args.no_token_cache else args.token_cache,
+    )
+
+
+def add_export_arguments(parser):
+    """Add the connection and export options shared with the stack pipeline"""
+    add_auth_arguments(parser)
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of stacks to export concurrently (default: 1, serial)",
+    )
+    parser.add_argument(
+        "-i",
+        "--incremental",
+        action="store_true",
+        help="Only fetch stacks modified since the last export and remove "
+        "directories of deleted stacks",
+    )
+    parser.add_argument(
+        "-v", "--verbose", action="store_true", help="Enable debug logging"
+    )
+    parser.add_argument(
+        "--stats-file",
+        help="Write per-endpoint API timing stats as JSON to this file",
+    )
+
 
-    password = args.password or getpass("Portainer Password: ")
+def run_export(parser, args, transform=None):
+    """Export every stack as configured by args, optionally transforming each"""
+    auth = auth_from_args(parser, args)
+    if args.verbose:
+        logger.setLevel(logging.DEBUG)
 
     os.makedirs(OUTPUT_DIR, exist_ok=True)
-    token = login(args.username, password)
-    stacks = get_stacks(token)
+    stacks = get_stacks(auth)
+
+    logger.info("Retrieved %d stack(s)", len(stacks))
+    manifest = load_manifest()
+    counts = {"added": 0, "changed": 0, "unchanged": 0, "removed": 0}
+    for stack, status, entry in export_all(
+        auth, stacks, manifest, args.incremental, args.workers, transform
+    ):
+        counts[status] += 1
+        manifest[str(stack["Id"])] = entry
+
+    if args.incremental:
+        counts["removed"] = remove_stale_stacks(manifest, stacks)
+    save_manifest(manifest)
+
+    logger.info(
+        "Export complete: %d added, %d changed, %d unchanged, %d removed",
+        counts["added"],
+        counts["changed"],
+        counts["unchanged"],
+        counts["removed"],
+    )
 
-    print(f"[DEBUG] Retrieved {len(stacks)} stack(s)")
-    for stack in stacks:
-        print(f"\n[DEBUG] Stack Summary: {stack['Name']} (ID: {stack['Id']})")
-
-        details = get_stack_detail(token, stack["Id"])
-        print(f"[DEBUG] Stack Detail JSON:\n{json.dumps(details, indent=2)}")
-
-        env_vars = details.get("Env", [])
-        save_env_file(stack["Name"], env_vars)
-
-        # Try to get the actual file from /api/stacks/{id}/file
-        stack_content = get_stack_file(token, stack["Id"])
-
-        # Check if content is accidentally JSON-wrapped
-        try:
-            parsed = json.loads(stack_content)
-            if isinstance(parsed, dict) and "StackFileContent" in parsed:
-                print(
-                    f"[DEBUG] Extracting YAML from JSON-wrapped response for {stack['Name']}"
-                )
-                stack_content = parsed["StackFileContent"]
-        except (json.JSONDecodeError, TypeError):
-            pass  # It's raw YAML
-
-        if stack_content:
-            save_stack(stack["Name"], stack_content)
-        else:
-            print(f"[!] Skipping {stack['Name']} (no file content returned)")
+    logger.info("API call summary:")
+    API_STATS.log_summary()
+    if args.stats_file:
+        API_STATS.write(args.stats_file)
+        logger.info("API stats written to %s", args.stats_file)
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(
+        description="Export Portainer stacks to Docker Compose files."
+    )
+    add_export_arguments(parser)
+    run_export(parser, parser.parse_args())
 
 
 if __name__ == "__main__":
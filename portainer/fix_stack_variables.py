@@ -1,11 +1,18 @@
 """Script to convert all docker-compose.yml to use variables for user defined environments"""
 
+import argparse
+import hashlib
+import json
 import logging
+import os
 import re
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
-from ruamel.yaml import YAML
 from ruamel.yaml.error import YAMLError
+from yaml import YAMLError as FastYAMLError
+
+import yaml_io
 
 # Set up logging
 logging.basicConfig(
@@ -15,90 +22,137 @@ logger = logging.getLogger(__name__)
 
 # Base directory where portainer-stacks are located
 BASE_DIR = "portainer-stacks"
+# Per-stack input fingerprints and outcomes from the last run, kept in BASE_DIR
+CACHE_FILE = ".fix-variables-cache.json"
+STACK_INPUTS = ("stack.env", "docker-compose.yml")
 
+# Match lines with format VAR=redacted or VAR="redacted"
+REDACTED_LINE = re.compile(r'^([A-Za-z0-9_]+)=(?:"?redacted"?|\'?redacted\'?)$')
 
-def parse_env_file(env_file_path):
-    """Parse a .env file and extract variable names that are marked as 'redacted'."""
+
+def find_redacted_vars(lines):
+    """Return the names of variables whose value is 'redacted' in .env lines"""
     redacted_vars = []
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+
+        match = REDACTED_LINE.match(line)
+        if match:
+            redacted_vars.append(match.group(1))
+    return redacted_vars
 
+
+def parse_env_file(env_file_path):
+    """Parse a .env file and extract variable names that are marked as 'redacted'."""
     try:
         with open(env_file_path, "r", encoding="utf-8") as f:
-            for line in f:
-                line = line.strip()
-                if not line or line.startswith("#"):
-                    continue
-
-                # Match lines with format VAR=redacted or VAR="redacted"
-                match = re.match(
-                    r'^([A-Za-z0-9_]+)=(?:"?redacted"?|\'?redacted\'?)$', line
-                )
-                if match:
-                    redacted_vars.append(match.group(1))
+            return find_redacted_vars(f)
     except (IOError, OSError, UnicodeDecodeError) as e:
         logger.error("Error parsing env file %s: %s", env_file_path, e)
+        return []
 
-    return redacted_vars
+
+def stack_env_services(compose_data):
+    """Yield (name, config) for each service that loads stack.env"""
+    for service_name, service_config in (compose_data.get("services") or {}).items():
+        # Only modify services that explicitly use stack.env
+        if "env_file" not in service_config:
+            continue
+
+        # Handle both string and list formats for env_file
+        env_files = service_config["env_file"]
+        if not isinstance(env_files, list):
+            env_files = [env_files]
+
+        if "stack.env" in env_files:
+            yield service_name, service_config
+
+
+def environment_keys(environment):
+    """Variable names set by a service's environment, as a dict or KEY=value list"""
+    if isinstance(environment, list):
+        return {item.split("=", 1)[0] for item in environment if "=" in item}
+    return set(environment or {})
+
+
+def missing_redacted_vars(compose_data, redacted_vars):
+    """Whether any stack.env service doesn't define one of redacted_vars yet"""
+    for _, service_config in stack_env_services(compose_data):
+        defined = environment_keys(service_config.get("environment"))
+        if any(var not in defined for var in redacted_vars):
+            return True
+    return False
+
+
+def needs_update(compose_file_path, redacted_vars):
+    """Check with the fast loader whether any stack.env service lacks a variable
+
+    Lets unchanged files skip the much slower round-trip load entirely.
+    """
+    with open(compose_file_path, "r", encoding="utf-8") as f:
+        compose_data = yaml_io.load(f, fast=True)
+    if not compose_data:
+        return True  # let update_compose_file report it
+    return missing_redacted_vars(compose_data, redacted_vars)
+
+
+def add_redacted_vars(compose_data, redacted_vars):
+    """Add ${VAR} entries for redacted_vars to every service that uses stack.env
+
+    Modifies compose_data in place and returns whether anything was added.
+    """
+    changes_made = False
+
+    # Process all services that use stack.env
+    for service_name, service_config in stack_env_services(compose_data):
+        # Add environment section if it doesn't exist
+        if "environment" not in service_config:
+            service_config["environment"] = {}
+
+        # If environment is a list, convert to dict
+        if isinstance(service_config["environment"], list):
+            env_dict = {}
+            for item in service_config["environment"]:
+                if "=" in item:
+                    key, value = item.split("=", 1)
+                    env_dict[key] = value
+            service_config["environment"] = env_dict
+
+        # Add redacted variables with ${VAR} syntax
+        for var in redacted_vars:
+            # Skip if already explicitly defined
+            if var not in service_config["environment"]:
+                service_config["environment"][var] = f"${{{var}}}"
+                changes_made = True
+                logger.info("Added ${%s} to service %s", var, service_name)
+    return changes_made
 
 
 def update_compose_file(compose_file_path, redacted_vars, _stack_path):
-    """Update the docker-compose.yml file to use ${VAR} syntax for redacted variables."""
+    """Update the docker-compose.yml file to use ${VAR} syntax for redacted variables.
+
+    Returns True if the file was rewritten, False if it needed no changes and
+    None if it could not be read, parsed or written.
+    """
     logger.info("Processing %s", compose_file_path)
 
     try:
-        # Configure YAML parser to preserve format
-        yaml = YAML()
-        yaml.preserve_quotes = True
-        yaml.indent(mapping=2, sequence=4, offset=2)
-
-        # Load the YAML file
+        # Load the YAML file with the shared format-preserving parser
         with open(compose_file_path, "r", encoding="utf-8") as f:
-            compose_data = yaml.load(f)
+            compose_data = yaml_io.load(f)
 
         if not compose_data:
             logger.warning("Empty or invalid YAML in %s", compose_file_path)
             return False
 
-        changes_made = False
-
-        # Process all services
-        if "services" in compose_data:
-            for service_name, service_config in compose_data["services"].items():
-                # Only modify services that explicitly use stack.env
-                if "env_file" in service_config:
-                    # Handle both string and list formats for env_file
-                    env_files = service_config["env_file"]
-                    if not isinstance(env_files, list):
-                        env_files = [env_files]
-
-                    # Skip if this service doesn't use stack.env
-                    if "stack.env" not in env_files:
-                        continue
-
-                    # Add environment section if it doesn't exist
-                    if "environment" not in service_config:
-                        service_config["environment"] = {}
-
-                    # If environment is a list, convert to dict
-                    if isinstance(service_config["environment"], list):
-                        env_dict = {}
-                        for item in service_config["environment"]:
-                            if "=" in item:
-                                key, value = item.split("=", 1)
-                                env_dict[key] = value
-                        service_config["environment"] = env_dict
-
-                    # Add redacted variables with ${VAR} syntax
-                    for var in redacted_vars:
-                        # Skip if already explicitly defined
-                        if var not in service_config["environment"]:
-                            service_config["environment"][var] = f"${{{var}}}"
-                            changes_made = True
-                            logger.info("Added ${%s} to service %s", var, service_name)
+        changes_made = add_redacted_vars(compose_data, redacted_vars)
 
         # If changes were made, write the updated file
         if changes_made:
             with open(compose_file_path, "w", encoding="utf-8") as f:
-                yaml.dump(compose_data, f)
+                yaml_io.dump_roundtrip(compose_data, f)
             logger.info("Updated %s", compose_file_path)
             return True
         else:
@@ -107,17 +161,197 @@ def update_compose_file(compose_file_path, redacted_vars, _stack_path):
 
     except (IOError, OSError) as e:
         logger.error("Error opening or writing to file %s: %s", compose_file_path, e)
-        return False
+        return None
     except YAMLError as e:
         logger.error("YAML parsing error in %s: %s", compose_file_path, e)
-        return False
+        return None
     except (TypeError, KeyError, ValueError) as e:
         logger.error("Error processing YAML data in %s: %s", compose_file_path, e)
-        return False
+        return None
+
+
+def process_stack(stack_dir, fast_scan=False):
+    """Process one stack directory.
+
+    Returns "skipped" if a required file is missing, otherwise "updated" or
+    "processed" depending on whether the compose file was changed, or "failed"
+    if it could not be handled. With
+    `fast_scan`, compose files that already reference every redacted variable
+    are checked with the C loader and never round-tripped.
+    """
+    stack_name = stack_dir.name
+    env_file_path = stack_dir / "stack.env"
+    compose_file_path = stack_dir / "docker-compose.yml"
+
+    # Skip if either file doesn't exist
+    if not env_file_path.exists() or not compose_file_path.exists():
+        logger.warning(
+            "Stack %s is missing stack.env or docker-compose.yml, skipping",
+            stack_name,
+        )
+        return "skipped"
+
+    # Get redacted variables from stack.env
+    redacted_vars = parse_env_file(env_file_path)
+
+    if not redacted_vars:
+        logger.info("No redacted variables found in %s", stack_name)
+        return "processed"
+
+    logger.info(
+        "Found %d redacted variables in %s: %s",
+        len(redacted_vars),
+        stack_name,
+        ", ".join(redacted_vars),
+    )
+
+    if fast_scan:
+        try:
+            if not needs_update(compose_file_path, redacted_vars):
+                logger.info("No changes needed for %s", compose_file_path)
+                return "processed"
+        except (OSError, FastYAMLError, AttributeError, TypeError) as e:
+            # Fall through so the round-trip pass reports the problem
+            logger.debug("Fast scan failed for %s: %s", compose_file_path, e)
+
+    # Update the compose file
+    updated = update_compose_file(compose_file_path, redacted_vars, stack_dir)
+    if updated is None:
+        return "failed"
+    return "updated" if updated else "processed"
+
+
+def load_cache(base_path):
+    """Load the incremental cache, keyed by stack directory name"""
+    cache_path = base_path / CACHE_FILE
+    if not cache_path.exists():
+        return {}
+    try:
+        with open(cache_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning("Ignoring unreadable cache %s: %s", cache_path, e)
+        return {}
+
+
+def save_cache(base_path, cache):
+    """Atomically write the incremental cache"""
+    cache_path = base_path / CACHE_FILE
+    tmp_path = cache_path.with_name(f"{CACHE_FILE}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(cache, f, indent=2, sort_keys=True)
+        f.write("\n")
+    os.replace(tmp_path, cache_path)
+
+
+def file_fingerprint(path, previous=None):
+    """Return the mtime, size and sha256 of a file
+
+    The hash in `previous` is reused when mtime and size still match, so
+    untouched files are only stat'ed.
+    """
+    stat = path.stat()
+    fingerprint = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+    if previous and all(previous.get(key) == fingerprint[key] for key in fingerprint):
+        fingerprint["sha256"] = previous["sha256"]
+    else:
+        with open(path, "rb") as f:
+            fingerprint["sha256"] = hashlib.sha256(f.read()).hexdigest()
+    return fingerprint
+
+
+def stack_fingerprint(stack_dir, previous=None):
+    """Fingerprint a stack's input files, or None if any of them is missing"""
+    previous = previous or {}
+    try:
+        return {
+            name: file_fingerprint(stack_dir / name, previous.get(name))
+            for name in STACK_INPUTS
+        }
+    except FileNotFoundError:
+        return None
+
+
+def same_inputs(current, cached):
+    """Whether two stack fingerprints have identical file contents"""
+    return all(
+        current[name]["sha256"] == cached.get(name, {}).get("sha256")
+        for name in STACK_INPUTS
+    )
+
+
+class RecordCollector(logging.Handler):
+    """Logging handler that keeps records so a worker can hand them back"""
+
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        # Render now so the record pickles cleanly back to the parent
+        record.msg = record.getMessage()
+        record.args = None
+        self.records.append(record)
+
+
+def process_stack_captured(stack_dir, fast_scan=False):
+    """Worker entry point: process a stack and return its status and log records"""
+    collector = RecordCollector()
+    root = logging.getLogger()
+    previous_handlers = root.handlers[:]
+    root.handlers = [collector]
+    try:
+        return process_stack(stack_dir, fast_scan), collector.records
+    finally:
+        root.handlers = previous_handlers
+
+
+def process_stacks(stack_dirs, jobs=1, fast_scan=False):
+    """Yield each stack's status in directory order, using `jobs` processes.
+
+    Worker log records are replayed in the parent one stack at a time, so the
+    output of different stacks never interleaves.
+    """
+    if jobs <= 1:
+        for stack_dir in stack_dirs:
+            yield process_stack(stack_dir, fast_scan)
+        return
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        results = executor.map(
+            process_stack_captured, stack_dirs, [fast_scan] * len(stack_dirs)
+        )
+        for status, records in results:
+            for record in records:
+                logging.getLogger(record.name).handle(record)
+            yield status
 
 
 def main():
     """Process all stacks in the base directory."""
+    parser = argparse.ArgumentParser(
+        description="Add ${VAR} references for redacted stack.env variables."
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="Number of stacks to process in parallel worker processes",
+    )
+    parser.add_argument(
+        "--fast-scan",
+        action="store_true",
+        help="Check compose files with the C YAML loader and only round-trip "
+        "the ones that need changes",
+    )
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="Reprocess every stack, ignoring the incremental cache",
+    )
+    args = parser.parse_args()
+
     base_path = Path(BASE_DIR)
 
     # Check if base directory exists
@@ -125,47 +359,52 @@ def main():
         logger.error("Base directory %s does not exist or is not a directory", BASE_DIR)
         return
 
+    cache = {} if args.full else load_cache(base_path)
+    new_cache = {}
+
     # Count statistics
     total_stacks = 0
     updated_stacks = 0
-
-    # Process each subdirectory (stack)
-    for stack_dir in base_path.iterdir():
-        if not stack_dir.is_dir():
-            continue
-
-        stack_name = stack_dir.name
-        env_file_path = stack_dir / "stack.env"
-        compose_file_path = stack_dir / "docker-compose.yml"
-
-        # Skip if either file doesn't exist
-        if not env_file_path.exists() or not compose_file_path.exists():
-            logger.warning(
-                "Stack %s is missing stack.env or docker-compose.yml, skipping",
-                stack_name,
+    skipped_stacks = 0
+
+    # Only stacks whose stack.env or compose file changed need processing
+    pending = []
+    for stack_dir in sorted(path for path in base_path.iterdir() if path.is_dir()):
+        entry = cache.get(stack_dir.name)
+        inputs = stack_fingerprint(stack_dir, entry and entry["inputs"])
+        if entry and inputs and same_inputs(inputs, entry["inputs"]):
+            logger.debug(
+                "Skipping %s, unchanged since last run (%s)",
+                stack_dir.name,
+                entry["status"],
             )
-            continue
-
-        total_stacks += 1
-
-        # Get redacted variables from stack.env
-        redacted_vars = parse_env_file(env_file_path)
-
-        if redacted_vars:
-            logger.info(
-                "Found %d redacted variables in %s: %s",
-                len(redacted_vars),
-                stack_name,
-                ", ".join(redacted_vars),
-            )
-
-            # Update the compose file
-            if update_compose_file(compose_file_path, redacted_vars, stack_dir):
-                updated_stacks += 1
+            new_cache[stack_dir.name] = {"inputs": inputs, "status": entry["status"]}
+            skipped_stacks += 1
         else:
-            logger.info("No redacted variables found in %s", stack_name)
+            pending.append((stack_dir, inputs))
 
-    logger.info("Processed %d stacks, updated %d", total_stacks, updated_stacks)
+    stack_dirs = [stack_dir for stack_dir, _ in pending]
+    statuses = process_stacks(stack_dirs, args.jobs, args.fast_scan)
+    for (stack_dir, inputs), status in zip(pending, statuses):
+        if status == "skipped":
+            continue
+        total_stacks += 1
+        if status == "updated":
+            updated_stacks += 1
+        if status != "failed":
+            # Fingerprint after processing so our own rewrite counts as seen
+            new_cache[stack_dir.name] = {
+                "inputs": stack_fingerprint(stack_dir, inputs),
+                "status": status,
+            }
+
+    save_cache(base_path, new_cache)
+    logger.info(
+        "Processed %d stacks, updated %d, skipped %d unchanged",
+        total_stacks,
+        updated_stacks,
+        skipped_stacks,
+    )
 
 
 if __name__ == "__main__":
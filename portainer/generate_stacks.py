@@ -0,0 +1,246 @@
+"""Script to generate synthetic stacks trees for benchmarking the stack scripts
+
+Writes <output>/homelab-stacks, the input of create_env.py, where services
+carry inline environment blocks, and <output>/portainer-stacks, the input of
+fix_stack_variables.py, where services load stack.env and a share of its
+values are redacted. Compose files are written as text in the hand-edited
+style of real stacks, so the round-trip parser sees quotes and comments.
+"""
+
+import argparse
+import os
+import random
+import shutil
+
+OUTPUT_DIR = "synthetic-stacks"
+HOMELAB_DIR = "homelab-stacks"
+PORTAINER_DIR = "portainer-stacks"
+ENV_FORMS = ("list", "dict", "mixed")
+IMAGES = (
+    "ghcr.io/linuxserver/{name}:latest",
+    "docker.io/library/{name}:1.27",
+    "ghcr.io/example/{name}:v2.4.1",
+    "postgres:16",
+    "redis:7-alpine",
+)
+ENV_NAMES = (
+    "TZ",
+    "PUID",
+    "PGID",
+    "DB_HOST",
+    "DB_USER",
+    "DB_PASSWORD",
+    "API_TOKEN",
+    "SECRET_KEY",
+    "SMTP_PASSWORD",
+    "LOG_LEVEL",
+)
+
+
+def env_names(count):
+    """Return `count` variable names, realistic ones first"""
+    names = list(ENV_NAMES[:count])
+    names.extend(f"SETTING_{index:03d}" for index in range(count - len(names)))
+    return names
+
+
+def env_value(rng):
+    """A random value, sometimes one that needs quoting in YAML"""
+    value = "".join(
+        rng.choice("abcdefghijklmnopqrstuvwxyz0123456789") for _ in range(16)
+    )
+    return rng.choice(
+        (value, f"{value}:{rng.randint(1, 9999)}", str(rng.randint(0, 5000)))
+    )
+
+
+def environment_lines(env, form):
+    """Render a service's environment block in list or dict form"""
+    lines = ["    environment:"]
+    for key, value in env.items():
+        if form == "list":
+            lines.append(f"      - {key}={value}")
+        else:
+            lines.append(f'      {key}: "{value}"')
+    return lines
+
+
+def service_lines(stack_name, index, rng, env=None, form="dict", env_file=False):
+    """Render one service definition"""
+    name = f"{stack_name}-svc{index}"
+    lines = [
+        f"  svc{index}:",
+        f"    image: {rng.choice(IMAGES).format(name=stack_name)}",
+        f"    container_name: {name}",
+        "    restart: unless-stopped",
+    ]
+    if env_file:
+        # Both forms appear in real stacks
+        if rng.random() < 0.5:
+            lines.append("    env_file: stack.env")
+        else:
+            lines.extend(["    env_file:", "      - stack.env"])
+    if env:
+        lines.extend(environment_lines(env, form))
+    lines.extend(
+        [
+            "    ports:",
+            f'      - "{8000 + rng.randint(0, 999)}:{rng.choice((80, 443, 8080))}"',
+            "    volumes:",
+            f"      - /srv/{stack_name}/svc{index}:/config  # persistent data",
+            "    labels:",
+            '      traefik.enable: "true"',
+            f"      traefik.http.routers.{name}.rule: Host(`{name}.example.com`)",
+        ]
+    )
+    return lines
+
+
+def pick_form(rng, env_form):
+    """The environment form for one service"""
+    return rng.choice(("list", "dict")) if env_form == "mixed" else env_form
+
+
+def write_file(path, content):
+    """Write text to path"""
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(content)
+
+
+def generate_homelab_stack(stack_path, stack_name, rng, services, env_vars, env_form):
+    """Write a create_env.py input stack with inline environment blocks"""
+    lines = [f"# {stack_name} stack", "services:"]
+    for index in range(services):
+        env = {name: env_value(rng) for name in env_names(env_vars)}
+        lines.extend(
+            service_lines(stack_name, index, rng, env, pick_form(rng, env_form))
+        )
+    write_file(os.path.join(stack_path, "docker-compose.yml"), "\n".join(lines) + "\n")
+
+
+def generate_portainer_stack(
+    stack_path, stack_name, rng, services, env_vars, env_form, redacted_ratio
+):
+    """Write a fix_stack_variables.py input stack with a partly redacted stack.env"""
+    names = env_names(env_vars)
+    redacted = {name for name in names if rng.random() < redacted_ratio}
+    env_lines = [
+        f"{name}=redacted" if name in redacted else f"{name}={env_value(rng)}"
+        for name in names
+    ]
+    write_file(os.path.join(stack_path, "stack.env"), "\n".join(env_lines) + "\n")
+
+    lines = [f"# {stack_name} stack", "services:"]
+    for index in range(services):
+        # Export leaves the non-secret variables inline
+        env = {name: env_value(rng) for name in names if name not in redacted}
+        lines.extend(
+            service_lines(
+                stack_name, index, rng, env, pick_form(rng, env_form), env_file=True
+            )
+        )
+    write_file(os.path.join(stack_path, "docker-compose.yml"), "\n".join(lines) + "\n")
+
+
+def generate_trees(
+    output_dir,
+    stacks,
+    services=3,
+    env_vars=10,
+    env_form="mixed",
+    redacted_ratio=0.3,
+    seed=0,
+):
+    """Write both synthetic trees under output_dir and return their paths
+
+    The same seed always gives the same trees.
+    """
+    rng = random.Random(seed)
+    homelab_dir = os.path.join(output_dir, HOMELAB_DIR)
+    portainer_dir = os.path.join(output_dir, PORTAINER_DIR)
+    for index in range(stacks):
+        stack_name = f"stack{index:05d}"
+        homelab_path = os.path.join(homelab_dir, stack_name)
+        portainer_path = os.path.join(portainer_dir, stack_name)
+        os.makedirs(homelab_path)
+        os.makedirs(portainer_path)
+        generate_homelab_stack(
+            homelab_path, stack_name, rng, services, env_vars, env_form
+        )
+        generate_portainer_stack(
+            portainer_path,
+            stack_name,
+            rng,
+            services,
+            env_vars,
+            env_form,
+            redacted_ratio,
+        )
+    return homelab_dir, portainer_dir
+
+
+def add_generator_arguments(parser):
+    """Add the corpus shape options shared with stack_benchmark.py"""
+    parser.add_argument(
+        "--services", type=int, default=3, help="Services per stack (default: 3)"
+    )
+    parser.add_argument(
+        "--env-vars",
+        type=int,
+        default=10,
+        help="Environment variables per service (default: 10)",
+    )
+    parser.add_argument(
+        "--env-form",
+        choices=ENV_FORMS,
+        default="mixed",
+        help="Write environment blocks as lists, dicts or both (default: mixed)",
+    )
+    parser.add_argument(
+        "--redacted-ratio",
+        type=float,
+        default=0.3,
+        help="Share of stack.env values that are redacted (default: 0.3)",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+
+
+def main():
+    """Parse arguments and write the synthetic trees"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "-o",
+        "--output-dir",
+        default=OUTPUT_DIR,
+        help=f"Directory to create the trees in (default: {OUTPUT_DIR})",
+    )
+    parser.add_argument(
+        "-s", "--stacks", type=int, default=100, help="Number of stacks per tree"
+    )
+    parser.add_argument(
+        "--force", action="store_true", help="Replace trees that already exist"
+    )
+    add_generator_arguments(parser)
+    args = parser.parse_args()
+
+    for name in (HOMELAB_DIR, PORTAINER_DIR):
+        path = os.path.join(args.output_dir, name)
+        if os.path.exists(path):
+            if not args.force:
+                parser.error(f"{path} already exists, use --force to replace it")
+            shutil.rmtree(path)
+
+    homelab_dir, portainer_dir = generate_trees(
+        args.output_dir,
+        args.stacks,
+        args.services,
+        args.env_vars,
+        args.env_form,
+        args.redacted_ratio,
+        args.seed,
+    )
+    print(f"[✓] Wrote {args.stacks} stacks to {homelab_dir} and {portainer_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""Portainer authentication with an on-disk JWT cache and API-key support"""
+
+import base64
+import binascii
+import json
+import logging
+import os
+import threading
+import time
+from getpass import getpass
+
+logger = logging.getLogger(__name__)
+
+TOKEN_CACHE_PATH = os.path.join(
+    os.path.expanduser("~"), ".cache", "portainer-scripts", "token.json"
+)
+# Re-authenticate this many seconds before the cached JWT actually expires
+EXPIRY_MARGIN = 300
+
+
+def jwt_expiry(token):
+    """Return the exp claim of a JWT as a unix timestamp, or None if unreadable"""
+    try:
+        payload = token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        claims = json.loads(base64.urlsafe_b64decode(payload))
+        return float(claims["exp"])
+    except (IndexError, KeyError, TypeError, ValueError, binascii.Error):
+        return None
+
+
+class PortainerAuth:
+    """Supplies auth headers for Portainer API calls
+
+    With an API key every request is sent with X-API-Key and no login happens.
+    Otherwise a JWT is taken from the cache file while it is still valid, or
+    obtained through `login_func(username, password)`; the password is only
+    prompted for when a login is actually needed.
+    """
+
+    def __init__(
+        self,
+        login_func,
+        url,
+        username=None,
+        password=None,
+        api_key=None,
+        cache_path=TOKEN_CACHE_PATH,
+    ):
+        self.login_func = login_func
+        self.url = url
+        self.username = username
+        self.password = password
+        self.api_key = api_key
+        self.cache_path = cache_path
+        self._token = None
+        self._lock = threading.Lock()
+
+    @property
+    def can_refresh(self):
+        """Whether a 401 can be fixed by logging in again"""
+        return self.api_key is None
+
+    def headers(self):
+        """Headers to send with an authenticated request"""
+        if self.api_key:
+            return {"X-API-Key": self.api_key}
+        return {"Authorization": f"Bearer {self.token()}"}
+
+    def token(self):
+        """Return a JWT that is valid for at least EXPIRY_MARGIN more seconds"""
+        with self._lock:
+            if self._token is None or not self._is_fresh(self._token):
+                self._token = self._load_cached() or self._login()
+            return self._token
+
+    def refresh(self, rejected_headers):
+        """Discard a token the server rejected and log in again
+
+        Concurrent callers that hit the same 401 share one re-login: if the
+        token already changed since `rejected_headers` was built, it is reused.
+        """
+        with self._lock:
+            if rejected_headers.get("Authorization") == f"Bearer {self._token}":
+                logger.info("Portainer rejected the cached token, re-authenticating")
+                self._token = self._login()
+
+    @staticmethod
+    def _is_fresh(token):
+        expiry = jwt_expiry(token)
+        return expiry is None or expiry - EXPIRY_MARGIN > time.time()
+
+    def _load_cached(self):
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return None
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                cached = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning("Ignoring unreadable token cache %s: %s", self.cache_path, e)
+            return None
+        if cached.get("url") != self.url or cached.get("username") != self.username:
+            return None
+        token = cached.get("jwt")
+        if not token or jwt_expiry(token) is None or not self._is_fresh(token):
+            return None
+        logger.info("Using cached Portainer token for %s", self.username)
+        return token
+
+    def _login(self):
+        if self.password is None:
+            self.password = getpass("Portainer Password: ")
+        token = self.login_func(self.username, self.password)
+        self._save_cached(token)
+        return token
+
+    def _save_cached(self, token):
+        if not self.cache_path:
+            return
+        directory = os.path.dirname(self.cache_path)
+        if directory:
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+        # Create with owner-only permissions before any token bytes are written
+        tmp_path = f"{self.cache_path}.tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"url": self.url, "username": self.username, "jwt": token}, f)
+        os.chmod(tmp_path, 0o600)
+        os.replace(tmp_path, self.cache_path)
@@ -0,0 +1,450 @@
+"""Deduplicating store for Portainer backup snapshots
+
+Each snapshot is split into content-defined chunks, so data that is the same
+as in an earlier snapshot lands in the same chunks even if bytes were inserted
+or removed before it. Every unique chunk is stored once, zlib-compressed, under
+chunks/ and each snapshot is a JSON index of its chunk digests.
+
+Portainer backups are gzip-compressed tarballs, in which a small change alters
+every compressed byte after it. Gzip input (detected by its magic bytes) is
+therefore chunked decompressed and recorded as "compression": "gzip", and
+restore compresses it again unless --raw is given. The re-compressed archive
+has the same tar content, verified against the recorded checksum, but is not
+necessarily byte-identical to the original, so a .sha256 written for the
+original may not match; restore logs which is the case. Backups encrypted with
+--backup-password look random and get no deduplication at all.
+"""
+
+import argparse
+import gzip
+import hashlib
+import io
+import json
+import logging
+import os
+import random
+import sys
+import time
+import zlib
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+STORE_DIR = "snapshot-store"
+READ_SIZE = 1024 * 1024
+GZIP_MAGIC = b"\x1f\x8b"
+MIN_CHUNK = 32 * 1024
+MAX_CHUNK = 256 * 1024
+# A boundary is cut when the top 15 bits of the gear hash are zero, which
+# gives chunks of about MIN_CHUNK + 32 KiB on average. Bytes before MIN_CHUNK
+# aren't hashed, which halves the time spent in the per-byte loop.
+BOUNDARY_MASK = 0x7FFF << 49
+HASH_MASK = (1 << 64) - 1
+# Fixed table so chunk boundaries are stable across runs and machines
+GEAR = [random.Random(0x9E3779B9 + i).getrandbits(64) for i in range(256)]
+
+
+def split_chunks(stream):
+    """Yield content-defined chunks of a binary stream using a gear hash
+
+    Boundaries depend only on the preceding 64 bytes, so an edit only changes
+    the chunks around it. Hashing starts MIN_CHUNK bytes into each chunk and
+    a cut is forced at MAX_CHUNK.
+    """
+    gear, boundary_mask, hash_mask = GEAR, BOUNDARY_MASK, HASH_MASK
+    pending = bytearray()
+    gear_hash = 0
+    for data in iter(lambda: stream.read(READ_SIZE), b""):
+        start = index = 0
+        end = len(data)
+        while index < end:
+            size = len(pending) + index - start
+            if size < MIN_CHUNK:
+                index = min(end, index + MIN_CHUNK - size)
+                continue
+            stop = min(end, index + MAX_CHUNK - size)
+            while index < stop:
+                gear_hash = ((gear_hash << 1) + gear[data[index]]) & hash_mask
+                index += 1
+                if not gear_hash & boundary_mask:
+                    break
+            else:
+                if stop == end and len(pending) + index - start < MAX_CHUNK:
+                    break  # Need more data to find this chunk's end
+            pending += data[start:index]
+            yield bytes(pending)
+            pending.clear()
+            gear_hash = 0
+            start = index
+        pending += data[start:]
+    if pending:
+        yield bytes(pending)
+
+
+class HashingReader:
+    """Read-only file wrapper that hashes and counts the bytes read through it"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.hash = hashlib.sha256()
+        self.size = 0
+
+    def read(self, size=-1):
+        """Read from the wrapped stream, hashing what was read"""
+        data = self.stream.read(size)
+        self.hash.update(data)
+        self.size += len(data)
+        return data
+
+
+class HashingWriter:
+    """Write-only file wrapper that hashes and counts the bytes written to it"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.hash = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data):
+        """Write to the wrapped stream, hashing what was written"""
+        self.hash.update(data)
+        self.size += len(data)
+        return self.stream.write(data)
+
+    def flush(self):
+        """Flush the wrapped stream"""
+        self.stream.flush()
+
+
+class SnapshotStore:
+    """Chunk directory plus one JSON index per snapshot"""
+
+    def __init__(self, path=STORE_DIR):
+        self.path = path
+        self.chunk_dir = os.path.join(path, "chunks")
+        self.index_dir = os.path.join(path, "snapshots")
+
+    def _chunk_path(self, digest):
+        return os.path.join(self.chunk_dir, digest[:2], digest)
+
+    def _index_path(self, name):
+        return os.path.join(self.index_dir, f"{name}.json")
+
+    def snapshots(self):
+        """Names of all snapshots, oldest first"""
+        if not os.path.isdir(self.index_dir):
+            return []
+        names = [
+            name[: -len(".json")]
+            for name in os.listdir(self.index_dir)
+            if name.endswith(".json")
+        ]
+        return sorted(
+            names, key=lambda name: (os.path.getmtime(self._index_path(name)), name)
+        )
+
+    def load_index(self, name):
+        """Return a snapshot's index"""
+        with open(self._index_path(name), "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def ingest(self, stream, name, level=6, force=False):
+        """Store a stream as snapshot `name` and return its ingest stats
+
+        Raises FileExistsError if the snapshot exists, unless `force` replaces it.
+        """
+        if not force and os.path.exists(self._index_path(name)):
+            raise FileExistsError(f"Snapshot {name} already exists")
+        os.makedirs(self.index_dir, exist_ok=True)
+        started = time.perf_counter()
+        if not hasattr(stream, "peek"):
+            stream = io.BufferedReader(stream)
+        header = stream.peek(10)[:10]
+        archive = HashingReader(stream)
+        content = archive
+        compression = None
+        if header[:2] == GZIP_MAGIC:
+            # Chunk the tar inside, so unchanged files dedup across backups
+            content = gzip.GzipFile(fileobj=archive, mode="rb")
+            compression = "gzip"
+        total_hash = hashlib.sha256()
+        chunks = []
+        stats = dict.fromkeys(
+            ("bytes", "chunks", "new_chunks", "new_bytes", "stored_bytes"), 0
+        )
+
+        for chunk in split_chunks(content):
+            digest = hashlib.sha256(chunk).hexdigest()
+            total_hash.update(chunk)
+            chunks.append([digest, len(chunk)])
+            stats["bytes"] += len(chunk)
+            stats["chunks"] += 1
+
+            path = self._chunk_path(digest)
+            if os.path.exists(path):
+                continue
+            compressed = zlib.compress(chunk, level)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(compressed)
+            os.replace(tmp_path, path)
+            stats["new_chunks"] += 1
+            stats["new_bytes"] += len(chunk)
+            stats["stored_bytes"] += len(compressed)
+
+        index = {
+            "name": name,
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "size": stats["bytes"],
+            "sha256": total_hash.hexdigest(),
+            "compression": compression,
+            "archive_size": archive.size,
+            "archive_sha256": archive.hash.hexdigest(),
+            "chunks": chunks,
+        }
+        if compression == "gzip":
+            # Reused when compressing again on restore
+            index["gzip_mtime"] = int.from_bytes(header[4:8], "little")
+        tmp_path = f"{self._index_path(name)}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(index, f)
+        os.replace(tmp_path, self._index_path(name))
+
+        stats["compression"] = compression
+        stats["seconds"] = time.perf_counter() - started
+        return stats
+
+    def restore(self, name, output, raw=False):
+        """Stream snapshot `name` into a binary file object, verifying it
+
+        Snapshots ingested from gzip are compressed again unless `raw`. Only one
+        chunk is held in memory at a time. Raises ValueError if a chunk or the
+        whole snapshot doesn't match its recorded sha256. Returns the index and
+        the sha256 of the bytes written.
+        """
+        index = self.load_index(name)
+        written = HashingWriter(output)
+        target = written
+        if index.get("compression") == "gzip" and not raw:
+            target = gzip.GzipFile(
+                filename="", mode="wb", fileobj=written, mtime=index["gzip_mtime"]
+            )
+        total_hash = hashlib.sha256()
+        for digest, size in index["chunks"]:
+            try:
+                with open(self._chunk_path(digest), "rb") as f:
+                    chunk = zlib.decompress(f.read())
+            except (OSError, zlib.error) as e:
+                raise ValueError(f"Chunk {digest} is missing or unreadable: {e}") from e
+            if len(chunk) != size or hashlib.sha256(chunk).hexdigest() != digest:
+                raise ValueError(f"Chunk {digest} is corrupt")
+            total_hash.update(chunk)
+            target.write(chunk)
+        if target is not written:
+            target.close()  # Writes the gzip trailer, leaves output open
+        if total_hash.hexdigest() != index["sha256"]:
+            raise ValueError(f"Snapshot {name} does not match its checksum")
+        return index, written.hash.hexdigest()
+
+    def usage(self):
+        """Logical bytes across all snapshots and bytes the chunks take on disk"""
+        logical = sum(self.load_index(name)["size"] for name in self.snapshots())
+        physical = 0
+        for root, _, files in os.walk(self.chunk_dir):
+            physical += sum(os.path.getsize(os.path.join(root, f)) for f in files)
+        return logical, physical
+
+    def prune(self, keep):
+        """Drop all but the newest `keep` snapshots and their unreferenced chunks
+
+        Returns (snapshots removed, chunks removed).
+        """
+        names = self.snapshots()
+        removed = names[:-keep] if keep > 0 else []
+        for name in removed:
+            os.remove(self._index_path(name))
+
+        referenced = {
+            digest
+            for name in self.snapshots()
+            for digest, _ in self.load_index(name)["chunks"]
+        }
+        chunks_removed = 0
+        for root, _, files in os.walk(self.chunk_dir):
+            for file_name in files:
+                if file_name not in referenced:
+                    os.remove(os.path.join(root, file_name))
+                    chunks_removed += 1
+        return removed, chunks_removed
+
+
+def dedup_ratio(logical, physical):
+    """Logical size divided by size on disk, or 0 for an empty store"""
+    return logical / physical if physical else 0.0
+
+
+def cmd_ingest(store, args):
+    """Add a file (or stdin) to the store as a new snapshot"""
+    name = args.name or os.path.basename(args.source).split(".")[0]
+    try:
+        if args.source == "-":
+            stats = store.ingest(sys.stdin.buffer, name, force=args.force)
+        else:
+            with open(args.source, "rb") as f:
+                stats = store.ingest(f, name, force=args.force)
+    except FileExistsError as e:
+        logger.error("%s, use --force to replace it", e)
+        sys.exit(1)
+
+    if stats["compression"]:
+        logger.info(
+            "%s is %s-compressed, chunking its content", name, stats["compression"]
+        )
+    reused = stats["bytes"] - stats["new_bytes"]
+    logger.info(
+        "Ingested %s: %.1f MB in %d chunks, %d new (%.1f MB raw, %.1f MB stored), "
+        "%.1f%% reused",
+        name,
+        stats["bytes"] / 1e6,
+        stats["chunks"],
+        stats["new_chunks"],
+        stats["new_bytes"] / 1e6,
+        stats["stored_bytes"] / 1e6,
+        100 * reused / stats["bytes"] if stats["bytes"] else 0,
+    )
+    logger.info(
+        "Ingest throughput: %.1f MB/s over %.2fs",
+        stats["bytes"] / 1e6 / stats["seconds"] if stats["seconds"] else 0,
+        stats["seconds"],
+    )
+    logical, physical = store.usage()
+    logger.info(
+        "Store holds %.1f MB of snapshots in %.1f MB of chunks, dedup ratio %.2fx",
+        logical / 1e6,
+        physical / 1e6,
+        dedup_ratio(logical, physical),
+    )
+
+
+def cmd_restore(store, args):
+    """Write a snapshot back out to a file (atomically) or stdout"""
+    started = time.perf_counter()
+    tmp_path = f"{args.output}.tmp"
+    try:
+        if args.output == "-":
+            index, digest = store.restore(args.name, sys.stdout.buffer, args.raw)
+        else:
+            with open(tmp_path, "wb") as f:
+                index, digest = store.restore(args.name, f, args.raw)
+            os.replace(tmp_path, args.output)
+    except ValueError as e:
+        logger.error("Restore of %s failed: %s", args.name, e)
+        sys.exit(1)
+    finally:
+        if args.output != "-" and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    elapsed = time.perf_counter() - started
+    size = index["size"]
+    logger.info(
+        "Restored %s: %.1f MB in %.2fs (%.1f MB/s)",
+        args.name,
+        size / 1e6,
+        elapsed,
+        size / 1e6 / elapsed if elapsed else 0,
+    )
+    if digest == index.get("archive_sha256"):
+        logger.info("Output is identical to the ingested file (sha256 %s)", digest)
+    elif index.get("compression") and not args.raw:
+        logger.warning(
+            "Content verified, but the re-compressed archive differs from the "
+            "ingested file (sha256 %s, was %s)",
+            digest,
+            index.get("archive_sha256"),
+        )
+    else:
+        logger.info("Wrote the decompressed content (sha256 %s)", digest)
+
+
+def cmd_list(store, _args):
+    """Print every snapshot with its size and chunk count"""
+    for name in store.snapshots():
+        index = store.load_index(name)
+        print(
+            f"{name:<40} {index['created']}  {index['size'] / 1e6:>9.1f} MB  "
+            f"{len(index['chunks']):>6} chunks"
+        )
+    logical, physical = store.usage()
+    print(
+        f"Total: {logical / 1e6:.1f} MB in {physical / 1e6:.1f} MB on disk "
+        f"(dedup ratio {dedup_ratio(logical, physical):.2f}x)"
+    )
+
+
+def cmd_prune(store, args):
+    """Remove old snapshots and the chunks only they used"""
+    removed, chunks_removed = store.prune(args.keep)
+    logger.info(
+        "Removed %d snapshot(s) and %d unreferenced chunk(s)",
+        len(removed),
+        chunks_removed,
+    )
+
+
+def main():
+    """Parse arguments and run the chosen store command"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "-s",
+        "--store",
+        default=STORE_DIR,
+        help=f"Store directory (default: {STORE_DIR})",
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    ingest = commands.add_parser(
+        "ingest",
+        help="Add a backup as a new snapshot",
+        description="Add a backup as a new snapshot. Gzip input, such as "
+        "Portainer's .tar.gz backups, is chunked decompressed so unchanged files "
+        "deduplicate; backups encrypted with --backup-password can't be "
+        "deduplicated.",
+    )
+    ingest.add_argument(
+        "source", help="Backup file (plain or gzip-compressed), or - for stdin"
+    )
+    ingest.add_argument(
+        "-n", "--name", help="Snapshot name (default: file name, required for -)"
+    )
+    ingest.add_argument(
+        "--force", action="store_true", help="Replace a snapshot of the same name"
+    )
+    ingest.set_defaults(func=cmd_ingest)
+
+    restore = commands.add_parser("restore", help="Write a snapshot back out")
+    restore.add_argument("name", help="Snapshot name")
+    restore.add_argument("output", help="Output file, or - for stdout")
+    restore.add_argument(
+        "--raw",
+        action="store_true",
+        help="Write gzip snapshots decompressed instead of compressing them again",
+    )
+    restore.set_defaults(func=cmd_restore)
+
+    list_parser = commands.add_parser("list", help="List snapshots")
+    list_parser.set_defaults(func=cmd_list)
+
+    prune = commands.add_parser("prune", help="Keep only the newest snapshots")
+    prune.add_argument("--keep", type=int, required=True)
+    prune.set_defaults(func=cmd_prune)
+
+    args = parser.parse_args()
+    if args.command == "ingest" and args.source == "-" and not args.name:
+        parser.error("--name is required when ingesting from stdin")
+    args.func(SnapshotStore(args.store), args)
+
+
+if __name__ == "__main__":
+    main()
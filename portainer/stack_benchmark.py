@@ -0,0 +1,218 @@
+"""Benchmark create_env.py and fix_stack_variables.py on synthetic stacks trees
+
+Each script/size case runs in a fresh spawned process on its own copy of a
+tree from generate_stacks.py, so peak RSS is measured per case. A second,
+profiled run splits the time into YAML parsing and dumping, file I/O and
+everything else (the scripts' own transformation and logging). Results are
+printed as a table and appended to a JSON Lines file so runs can be compared.
+
+The process-per-case approach is the one twitch-username-availability's
+benchmark.py uses; only the parts this benchmark needs are kept here.
+"""
+
+import argparse
+import contextlib
+import cProfile
+import json
+import logging
+import multiprocessing
+import os
+import pstats
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+import create_env
+import fix_stack_variables
+import generate_stacks
+
+RESULTS_PATH = "stack_benchmark_results.jsonl"
+# Script name -> (tree it reads, extra fix_stack_variables.py arguments)
+CASES = {
+    "create_env": (generate_stacks.HOMELAB_DIR, None),
+    "fix_variables": (generate_stacks.PORTAINER_DIR, []),
+    "fix_variables_fast": (generate_stacks.PORTAINER_DIR, ["--fast-scan"]),
+}
+YAML_MODULES = ("yaml", "ruamel", "_yaml", "_ruamel_yaml")
+IO_MODULES = ("pathlib", "genericpath", "posixpath", "shutil", "codecs")
+IO_BUILTINS = ("io.open", "_io.", "posix.")
+
+
+def run_script(case, stacks_dir):
+    """Run one script over stacks_dir in this process"""
+    if CASES[case][1] is None:
+        create_env.STACKS_DIR = stacks_dir
+        create_env.tidy_stack_envs()
+    else:
+        fix_stack_variables.BASE_DIR = stacks_dir
+        # --full so a cache file left by an earlier run can't skip work
+        sys.argv = ["fix_stack_variables.py", "--full", *CASES[case][1]]
+        fix_stack_variables.main()
+
+
+def categorise(location):
+    """File I/O, YAML or transform category of a profiled function"""
+    filename, _, function = location
+    if filename == "~":
+        # Built-ins, including the C parts of PyYAML and ruamel
+        if any(part in function for part in YAML_MODULES):
+            return "yaml"
+        if any(part in function for part in IO_BUILTINS):
+            return "io"
+        return "transform"
+    parts = filename.replace("\\", "/").split("/")
+    if any(part in YAML_MODULES for part in parts):
+        return "yaml"
+    module = os.path.splitext(parts[-1])[0]
+    if module in IO_MODULES or module in ("_pyio", "os"):
+        return "io"
+    return "transform"
+
+
+def time_shares(profiler):
+    """Share of profiled self time spent in each category, in percent"""
+    totals = {"yaml": 0.0, "transform": 0.0, "io": 0.0}
+    for location, (_, _, self_time, _, _) in pstats.Stats(profiler).stats.items():
+        totals[categorise(location)] += self_time
+    overall = sum(totals.values()) or 1.0
+    return {name: round(100 * value / overall, 1) for name, value in totals.items()}
+
+
+def run_case(case, stacks_dir, profile=False):
+    """Run one case in this process and return its measurements"""
+    logging.disable(logging.CRITICAL)
+    with open(os.devnull, "w", encoding="utf-8") as devnull:
+        profiler = cProfile.Profile() if profile else None
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(devnull):
+            if profiler:
+                profiler.runcall(run_script, case, stacks_dir)
+            else:
+                run_script(case, stacks_dir)
+        elapsed = time.perf_counter() - started
+
+    if profiler:
+        return time_shares(profiler)
+    stacks = sum(entry.is_dir() for entry in os.scandir(stacks_dir))
+    peak_kib = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {
+        "stacks": stacks,
+        "seconds": round(elapsed, 3),
+        "stacks_per_second": round(stacks / elapsed, 1) if elapsed else None,
+        "peak_rss_mb": round(peak_kib / 1024, 1),
+    }
+
+
+def run_isolated(case, template_dir, work_dir, profile=False):
+    """Run a case in a fresh spawned process on a fresh copy of its tree"""
+    stacks_dir = os.path.join(work_dir, CASES[case][0])
+    if os.path.exists(stacks_dir):
+        shutil.rmtree(stacks_dir)
+    shutil.copytree(os.path.join(template_dir, CASES[case][0]), stacks_dir)
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(1) as pool:
+        return pool.apply(run_case, (case, stacks_dir, profile))
+
+
+def append_results(path, record):
+    """Append a benchmark run to the results file as one JSON line"""
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record) + "\n")
+
+
+def cell(value):
+    """A table value, or - when it is missing (e.g. with --no-profile)"""
+    return "-" if value is None else value
+
+
+def print_table(results):
+    """Print one line per case"""
+    print(
+        f"{'case':<20} {'stacks':>7} {'seconds':>8} {'stacks/s':>9} {'rss MB':>7} "
+        f"{'yaml %':>7} {'transform %':>12} {'io %':>6}"
+    )
+    for result in results:
+        print(
+            f"{result['case']:<20} {result['stacks']:>7} {result['seconds']:>8} "
+            f"{cell(result['stacks_per_second']):>9} {result['peak_rss_mb']:>7} "
+            f"{cell(result['yaml']):>7} {cell(result['transform']):>12} "
+            f"{cell(result['io']):>6}"
+        )
+
+
+def main():
+    """Generate a tree per size and benchmark every script on it"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--sizes",
+        default="50,200,1000",
+        help="Comma-separated stack counts to benchmark (default: 50,200,1000)",
+    )
+    parser.add_argument(
+        "--cases",
+        default=",".join(CASES),
+        help=f"Comma-separated cases to run (default: {','.join(CASES)})",
+    )
+    parser.add_argument(
+        "--no-profile",
+        action="store_true",
+        help="Skip the profiled run that splits time into YAML, transform and I/O",
+    )
+    parser.add_argument("-o", "--output", default=RESULTS_PATH)
+    generate_stacks.add_generator_arguments(parser)
+    args = parser.parse_args()
+
+    cases = args.cases.split(",")
+    unknown = [case for case in cases if case not in CASES]
+    if unknown:
+        parser.error(f"unknown case(s): {', '.join(unknown)}")
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="stack-benchmark-") as tmp_dir:
+        for size in (int(size) for size in args.sizes.split(",")):
+            template_dir = os.path.join(tmp_dir, f"template-{size}")
+            work_dir = os.path.join(tmp_dir, "work")
+            generate_stacks.generate_trees(
+                template_dir,
+                size,
+                args.services,
+                args.env_vars,
+                args.env_form,
+                args.redacted_ratio,
+                args.seed,
+            )
+            for case in cases:
+                print(f"[*] Running {case} on {size} stacks...")
+                result = {"case": case}
+                result.update(run_isolated(case, template_dir, work_dir))
+                shares = {"yaml": None, "transform": None, "io": None}
+                if not args.no_profile:
+                    shares = run_isolated(case, template_dir, work_dir, profile=True)
+                result.update(shares)
+                results.append(result)
+            shutil.rmtree(template_dir)
+
+    # Save before printing so a formatting problem can't lose the timings
+    append_results(
+        args.output,
+        {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "corpus": {
+                "services": args.services,
+                "env_vars": args.env_vars,
+                "env_form": args.env_form,
+                "redacted_ratio": args.redacted_ratio,
+                "seed": args.seed,
+            },
+            "results": results,
+        },
+    )
+    print()
+    print_table(results)
+    print(f"\n[+] Results appended to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Export Portainer stacks, tidy them and add redacted variables in one pass
+
+Runs the steps of export_portainer_stacks.py, create_env.py and
+fix_stack_variables.py on each stack in memory, so its docker-compose.yml and
+stack.env are written once with their final content. The three scripts can
+still be run on their own.
+"""
+
+import argparse
+import io
+import logging
+
+from ruamel.yaml.error import YAMLError
+from yaml import YAMLError as FastYAMLError
+
+import yaml_io
+from create_env import (
+    fix_yaml_tabs,
+    move_environment_to_env_file,
+    parse_env,
+    render_env,
+)
+from export_portainer_stacks import add_export_arguments, run_export
+from fix_stack_variables import (
+    add_redacted_vars,
+    find_redacted_vars,
+    missing_redacted_vars,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def tidy(stack_name, compose_content, env_content):
+    """create_env step: move service environments into stack.env
+
+    Returns (compose content, stack.env content, parsed compose or None).
+    """
+    content = fix_yaml_tabs(compose_content)
+    try:
+        compose = yaml_io.safe_load(content) or {}
+    except FastYAMLError as e:
+        logger.warning("Not tidying %s: invalid YAML (%s)", stack_name, e)
+        return compose_content, env_content, None
+
+    merged_env = parse_env(env_content) if env_content is not None else {}
+    cleaned = move_environment_to_env_file(compose, merged_env)
+    for service_name in cleaned:
+        logger.info("Cleaned up %s/%s", stack_name, service_name)
+    if cleaned:
+        return yaml_io.dump(compose), render_env(merged_env), compose
+    return content, env_content, compose
+
+
+def fix_variables(stack_name, compose_content, env_content, compose):
+    """fix_stack_variables step: reference redacted stack.env variables
+
+    `compose` is the fast-loaded form of compose_content from the tidy step,
+    used to skip the round-trip parse when no variable is missing.
+    """
+    redacted_vars = find_redacted_vars((env_content or "").splitlines())
+    if not compose or not redacted_vars:
+        return compose_content
+    if not missing_redacted_vars(compose, redacted_vars):
+        return compose_content
+
+    try:
+        compose_data = yaml_io.load(compose_content)
+    except YAMLError as e:
+        logger.warning("Not adding variables to %s: %s", stack_name, e)
+        return compose_content
+    add_redacted_vars(compose_data, redacted_vars)
+    output = io.StringIO()
+    yaml_io.dump_roundtrip(compose_data, output)
+    return output.getvalue()
+
+
+def transform_stack(stack_name, compose_content, env_content):
+    """Run every step on one stack and return its final (compose, stack.env)"""
+    compose_content, env_content, compose = tidy(
+        stack_name, compose_content, env_content
+    )
+    compose_content = fix_variables(stack_name, compose_content, env_content, compose)
+    return compose_content, env_content
+
+
+def main():
+    """Export, tidy and fix every stack, writing each file once"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_export_arguments(parser)
+    run_export(parser, parser.parse_args(), transform=transform_stack)
+
+
+if __name__ == "__main__":
+    main()
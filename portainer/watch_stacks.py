@@ -0,0 +1,315 @@
+"""Watch the stacks directory and tidy/fix each stack as soon as it changes
+
+Uses inotify where available and falls back to polling file mtimes. Bursts of
+events are debounced and only the stacks whose files changed are run through
+the create_env and fix_stack_variables steps.
+"""
+
+import argparse
+import ctypes
+import ctypes.util
+import hashlib
+import logging
+import os
+import select
+import struct
+import time
+from pathlib import Path
+
+from create_env import read_text, write_atomic
+from stack_pipeline import transform_stack
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+STACKS_DIR = "homelab-stacks"
+STACK_FILES = ("docker-compose.yml", "stack.env")
+
+# inotify(7) constants
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+STACK_DIR_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_MOVED_FROM | IN_DELETE
+BASE_DIR_MASK = IN_CREATE | IN_MOVED_TO
+EVENT_HEADER = struct.Struct("iIII")
+
+
+class InotifyWatcher:
+    """Report which stacks had a file written, moved in or deleted via inotify"""
+
+    def __init__(self, base_path):
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self.base_path = base_path
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.stacks = {}  # watch descriptor -> stack name
+        self.base_wd = self._watch(base_path, BASE_DIR_MASK)
+        for path in base_path.iterdir():
+            if path.is_dir():
+                self._watch_stack(path.name)
+
+    def _watch(self, path, mask):
+        wd = self._add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {path}")
+        return wd
+
+    def _watch_stack(self, name):
+        """Watch a stack directory, returning False if it is already gone"""
+        try:
+            wd = self._watch(self.base_path / name, STACK_DIR_MASK)
+        except OSError as e:
+            # Created and removed (or renamed) before we got to it
+            logger.warning("Could not watch stack %s: %s", name, e)
+            return False
+        self.stacks[wd] = name
+        return True
+
+    def wait(self, timeout):
+        """Block up to timeout seconds (None: forever) and return changed stacks"""
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return set()
+        data = os.read(self.fd, 64 * 1024)
+        changed = set()
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset : offset + length].rstrip(b"\0").decode()
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                # Events were dropped, so any stack may have changed
+                changed.update(self.stacks.values())
+            elif mask & IN_IGNORED:
+                # The stack directory was removed
+                self.stacks.pop(wd, None)
+            elif wd == self.base_wd and mask & IN_ISDIR:
+                if self._watch_stack(name):
+                    changed.add(name)
+            elif wd in self.stacks and name in STACK_FILES:
+                changed.add(self.stacks[wd])
+        return changed
+
+    def close(self):
+        """Release the inotify descriptor"""
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    """Report which stacks changed by comparing file mtimes every interval"""
+
+    def __init__(self, base_path, interval=2.0):
+        self.base_path = base_path
+        self.interval = interval
+        self.snapshot = self._scan()
+
+    def _scan(self):
+        snapshot = {}
+        for path in self.base_path.iterdir():
+            if not path.is_dir():
+                continue
+            stats = []
+            for name in STACK_FILES:
+                try:
+                    stat = (path / name).stat()
+                    stats.append((stat.st_mtime_ns, stat.st_size))
+                except FileNotFoundError:
+                    stats.append(None)
+            snapshot[path.name] = tuple(stats)
+        return snapshot
+
+    def wait(self, timeout):
+        """Sleep until the next poll (or timeout) and return changed stacks"""
+        time.sleep(self.interval if timeout is None else min(timeout, self.interval))
+        snapshot = self._scan()
+        changed = {
+            name
+            for name in snapshot.keys() | self.snapshot.keys()
+            if snapshot.get(name) != self.snapshot.get(name)
+        }
+        self.snapshot = snapshot
+        return changed
+
+    def close(self):
+        """Nothing to release"""
+
+
+def make_watcher(base_path, poll_interval, force_poll=False):
+    """Return an inotify watcher, or a polling one if inotify is unavailable"""
+    if not force_poll:
+        try:
+            watcher = InotifyWatcher(base_path)
+            logger.info("Watching %s with inotify", base_path)
+            return watcher
+        except (OSError, AttributeError, TypeError) as e:
+            logger.warning("inotify unavailable (%s), falling back to polling", e)
+    logger.info("Polling %s every %.1fs", base_path, poll_interval)
+    return PollingWatcher(base_path, poll_interval)
+
+
+def stack_fingerprint(stack_path):
+    """sha256 of each stack file's content, None for missing files"""
+    fingerprint = []
+    for name in STACK_FILES:
+        try:
+            with open(stack_path / name, "rb") as f:
+                fingerprint.append(hashlib.sha256(f.read()).hexdigest())
+        except FileNotFoundError:
+            fingerprint.append(None)
+    return tuple(fingerprint)
+
+
+def process_stack(stack_path):
+    """Tidy and fix one stack on disk, writing only files whose content changed
+
+    Returns the names of the files written.
+    """
+    compose_file = stack_path / "docker-compose.yml"
+    env_file = stack_path / "stack.env"
+    compose_content = read_text(compose_file)
+    if compose_content is None:
+        return []
+    env_content = read_text(env_file)
+
+    new_compose, new_env = transform_stack(
+        stack_path.name, compose_content, env_content
+    )
+    written = []
+    if new_env is not None and new_env != env_content:
+        write_atomic(env_file, new_env)
+        written.append(env_file.name)
+    if new_compose != compose_content:
+        write_atomic(compose_file, new_compose)
+        written.append(compose_file.name)
+    return written
+
+
+class StackWatcher:
+    """Debounce change events and reprocess each changed stack once per burst"""
+
+    def __init__(self, base_path, watcher, debounce=0.5, max_delay=5.0):
+        self.base_path = base_path
+        self.watcher = watcher
+        self.debounce = debounce
+        self.max_delay = max_delay
+        # Content each stack had after we last looked at it; events that leave
+        # it unchanged (including our own writes) are ignored
+        self.known = {
+            path.name: stack_fingerprint(path)
+            for path in base_path.iterdir()
+            if path.is_dir()
+        }
+
+    def process(self, name, first_event):
+        """Reprocess one stack unless its content is what we last saw"""
+        stack_path = self.base_path / name
+        if not stack_path.is_dir():
+            self.known.pop(name, None)
+            return
+        fingerprint = stack_fingerprint(stack_path)
+        if fingerprint == self.known.get(name):
+            logger.debug("Ignoring %s, content unchanged (own write or touch)", name)
+            return
+
+        started = time.monotonic()
+        try:
+            written = process_stack(stack_path)
+        except Exception as e:  # pylint: disable=broad-except
+            # Usually a half-edited file; keep watching and retry on the next save
+            logger.error("Failed to process %s: %s: %s", name, type(e).__name__, e)
+            return
+        finished = time.monotonic()
+        self.known[name] = stack_fingerprint(stack_path)
+        logger.info(
+            "Reprocessed %s in %.1f ms, %.1f ms after its first event (%s)",
+            name,
+            (finished - started) * 1000,
+            (finished - first_event) * 1000,
+            ", ".join(written) if written else "no changes",
+        )
+
+    def run(self):
+        """Wait for events forever, processing stacks once they go quiet"""
+        pending = {}  # stack name -> time of its first event in this burst
+        while True:
+            timeout = self.debounce if pending else None
+            changed = self.watcher.wait(timeout)
+            now = time.monotonic()
+            for name in changed:
+                pending.setdefault(name, now)
+            if not pending:
+                continue
+            # Wait for a quiet period, but don't let a constant stream of
+            # events hold a stack back forever
+            if changed and now - min(pending.values()) < self.max_delay:
+                continue
+            for name, first_event in sorted(pending.items()):
+                self.process(name, first_event)
+            pending = {}
+
+
+def main():
+    """Parse arguments and watch the stacks directory until interrupted"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "-d",
+        "--stacks-dir",
+        default=STACKS_DIR,
+        help=f"Directory of stacks to watch (default: {STACKS_DIR})",
+    )
+    parser.add_argument(
+        "--debounce",
+        type=float,
+        default=0.5,
+        help="Seconds without events before a burst is processed",
+    )
+    parser.add_argument(
+        "--poll",
+        action="store_true",
+        help="Poll file mtimes instead of using inotify",
+    )
+    parser.add_argument(
+        "--poll-interval",
+        type=float,
+        default=2.0,
+        help="Seconds between scans when polling",
+    )
+    parser.add_argument(
+        "--initial-pass",
+        action="store_true",
+        help="Process every stack once before starting to watch",
+    )
+    args = parser.parse_args()
+
+    base_path = Path(args.stacks_dir)
+    if not base_path.is_dir():
+        logger.error("Stacks directory %s does not exist", base_path)
+        return
+
+    watcher = make_watcher(base_path, args.poll_interval, args.poll)
+    stack_watcher = StackWatcher(base_path, watcher, args.debounce)
+    if args.initial_pass:
+        for path in sorted(base_path.iterdir()):
+            if path.is_dir():
+                stack_watcher.known.pop(path.name, None)
+                stack_watcher.process(path.name, time.monotonic())
+    try:
+        stack_watcher.run()
+    except KeyboardInterrupt:
+        logger.info("Stopped watching %s", base_path)
+    finally:
+        watcher.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""Micro-benchmark of the YAML backends used by the stack scripts
+
+Times pure-Python against libyaml PyYAML loading and dumping, and a fresh
+ruamel parser per file against the shared one from yaml_io, on the compose
+files of a stacks directory.
+"""
+
+import argparse
+import gc
+import io
+import time
+from pathlib import Path
+
+import yaml
+from ruamel.yaml import YAML
+
+import yaml_io
+
+SAMPLE_COMPOSE = """services:
+  app:
+    image: ghcr.io/example/app:latest
+    container_name: app
+    restart: unless-stopped
+    env_file:
+      - stack.env
+    environment:
+      TZ: Europe/London
+      PUID: "1000"
+      PGID: "1000"
+    ports:
+      - "8080:8080"
+    volumes:
+      - /srv/app/config:/config
+      - /srv/app/data:/data
+    labels:
+      traefik.enable: "true"
+      traefik.http.routers.app.rule: Host(`app.example.com`)
+  db:
+    image: postgres:16
+    restart: unless-stopped
+    env_file: stack.env
+    volumes:
+      - /srv/app/db:/var/lib/postgresql/data
+"""
+
+
+def load_samples(stacks_dir):
+    """Return the text of every docker-compose.yml under stacks_dir"""
+    paths = sorted(Path(stacks_dir).glob("*/docker-compose.yml"))
+    return [path.read_text(encoding="utf-8") for path in paths]
+
+
+def new_roundtrip_parser():
+    """Build a ruamel parser the way the scripts used to, once per file"""
+    parser = YAML()
+    parser.preserve_quotes = True
+    parser.indent(mapping=2, sequence=4, offset=2)
+    return parser
+
+
+def roundtrip_with(get_parser):
+    """Return a case that loads and dumps each file through get_parser()"""
+
+    def run(text):
+        parser = get_parser()
+        parser.dump(parser.load(text), io.StringIO())
+
+    return run
+
+
+def time_case(func, inputs, repeat):
+    """Return the best per-file time in milliseconds over `repeat` passes
+
+    The garbage collector is paused while timing, as timeit does, so one case's
+    garbage isn't billed to the next.
+    """
+    best = None
+    for _ in range(repeat):
+        gc.collect()
+        gc.disable()
+        try:
+            started = time.perf_counter()
+            for item in inputs:
+                func(item)
+            elapsed = time.perf_counter() - started
+        finally:
+            gc.enable()
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1000 / len(inputs)
+
+
+def main():
+    """Run every case and print per-file times with the speedup of each pair"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "stacks_dir",
+        nargs="?",
+        default="homelab-stacks",
+        help="Directory of <stack>/docker-compose.yml files",
+    )
+    parser.add_argument(
+        "-r", "--repeat", type=int, default=5, help="Passes per case (best is kept)"
+    )
+    parser.add_argument(
+        "--samples",
+        type=int,
+        default=200,
+        help="Copies of a built-in compose file to use when no stacks are found",
+    )
+    args = parser.parse_args()
+
+    texts = load_samples(args.stacks_dir)
+    if texts:
+        print(f"[*] Using {len(texts)} compose file(s) from {args.stacks_dir}")
+    else:
+        print(f"[!] No compose files in {args.stacks_dir}, using a built-in sample")
+        texts = [SAMPLE_COMPOSE] * args.samples
+    if not yaml_io.HAS_LIBYAML:
+        print("[!] PyYAML was built without libyaml, C cases use pure Python")
+
+    documents = [yaml.load(text, Loader=yaml.SafeLoader) for text in texts]
+    pairs = [
+        (
+            "safe_load",
+            (lambda text: yaml.load(text, Loader=yaml.SafeLoader), texts),
+            (yaml_io.safe_load, texts),
+        ),
+        (
+            "dump",
+            (lambda data: yaml.dump(data, sort_keys=False), documents),
+            (yaml_io.dump, documents),
+        ),
+        (
+            "round-trip",
+            (roundtrip_with(new_roundtrip_parser), texts),
+            (roundtrip_with(yaml_io.roundtrip), texts),
+        ),
+        (
+            "scan",
+            (yaml_io.load, texts),
+            (lambda text: yaml_io.load(text, fast=True), texts),
+        ),
+    ]
+
+    print(f"{'case':<12} {'before ms':>10} {'after ms':>10} {'speedup':>8}")
+    for name, (before, before_inputs), (after, after_inputs) in pairs:
+        before_ms = time_case(before, before_inputs, args.repeat)
+        after_ms = time_case(after, after_inputs, args.repeat)
+        print(
+            f"{name:<12} {before_ms:>10.3f} {after_ms:>10.3f} "
+            f"{before_ms / after_ms:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""Shared YAML loading and dumping for the stack scripts
+
+PyYAML is used through libyaml's C classes when they are available, and the
+round-trip ruamel parser is configured once per process instead of per file.
+"""
+
+import functools
+
+import yaml
+from ruamel.yaml import YAML
+
+# libyaml is several times faster; fall back to pure Python when it's missing
+SafeLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+SafeDumper = getattr(yaml, "CSafeDumper", yaml.SafeDumper)
+HAS_LIBYAML = SafeLoader is not yaml.SafeLoader
+
+
+def safe_load(stream):
+    """Parse YAML into plain Python objects"""
+    return yaml.load(stream, Loader=SafeLoader)
+
+
+def dump(data):
+    """Serialise plain Python objects to YAML, keeping key order"""
+    return yaml.dump(data, Dumper=SafeDumper, sort_keys=False)
+
+
+@functools.lru_cache(maxsize=None)
+def roundtrip():
+    """Return this process's ruamel parser, set up to preserve compose formatting"""
+    parser = YAML()
+    parser.preserve_quotes = True
+    parser.indent(mapping=2, sequence=4, offset=2)
+    return parser
+
+
+def load(stream, fast=False):
+    """Parse YAML, round-trip by default or with the C safe loader when `fast`
+
+    Use `fast` only when the result is read, not dumped back: it loses comments,
+    quoting and key formatting.
+    """
+    if fast:
+        return safe_load(stream)
+    return roundtrip().load(stream)
+
+
+def dump_roundtrip(data, stream):
+    """Write data loaded with load() back out in its original style"""
+    roundtrip().dump(data, stream)
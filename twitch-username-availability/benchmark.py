@@ -0,0 +1,175 @@
+"""Offline benchmark for the username checker engines against the stand-in server.
+
+Each engine/concurrency case runs in a fresh process so peak memory is measured
+per case. Results are printed as a table and appended to a JSON file so runs can
+be compared over time.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import resource
+import time
+
+import standin_server
+from twitch_username_check import LatencyReport, TrafficStats, check_usernames_async
+
+RESULTS_PATH = "benchmark_results.json"
+
+
+def build_config(base_url, engine, concurrency, detection):
+    """Return a checker config pointed at the stand-in server."""
+    return {
+        "site": {
+            "url": f"{base_url}/",
+            "username_field": 'input[name="username"]',
+            "submit_button": 'button[type="submit"]',
+            "result_selector": "#result",
+            "detection": detection,
+            "response_url_pattern": "/api/check",
+            "engine": engine,
+            "api_url": f"{base_url}/api/check?username={{username}}",
+        },
+        "screenshots": {"policy": "never"},
+        "browser": {"isolated": False, "recycle_after": 1000},
+        "concurrency": {"max_pages": concurrency, "requests_per_second": 0},
+    }
+
+
+def run_case(config, usernames):
+    """Run one benchmark case in this process and return its measurements."""
+    latency_report = LatencyReport("benchmark")
+    started = time.perf_counter()
+    # The checker is chatty; keep the benchmark output to the summary table
+    with contextlib.redirect_stdout(io.StringIO()):
+        results = asyncio.run(
+            check_usernames_async(usernames, config, latency_report, TrafficStats())
+        )
+    elapsed = time.perf_counter() - started
+
+    samples = latency_report.samples
+    # ru_maxrss is reported in KiB on Linux
+    self_peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    children_peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    return {
+        "checks": len(usernames),
+        "errors": sum(1 for result_text, _ in results if not result_text),
+        "seconds": round(elapsed, 3),
+        "checks_per_second": round(len(usernames) / elapsed, 2) if elapsed else None,
+        "p50_ms": round(latency_report.percentile(50) * 1000, 1) if samples else None,
+        "p95_ms": round(latency_report.percentile(95) * 1000, 1) if samples else None,
+        "p99_ms": round(latency_report.percentile(99) * 1000, 1) if samples else None,
+        "peak_rss_mb": round(self_peak, 1),
+        "peak_child_rss_mb": round(children_peak, 1),
+    }
+
+
+def run_isolated(config, usernames):
+    """Run a case in a fresh spawned process and return its measurements."""
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(1) as pool:
+        return pool.apply(run_case, (config, usernames))
+
+
+def append_results(path, record):
+    """Append a benchmark run to the JSON results file."""
+    history = []
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as file:
+            history = json.load(file)
+    history.append(record)
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(history, file, indent=2)
+
+
+def print_table(cases):
+    """Print one line per benchmark case."""
+    print(
+        f"{'engine':<8} {'conc':>4} {'checks/s':>9} {'p50 ms':>8} {'p95 ms':>8} "
+        f"{'p99 ms':>8} {'errors':>6} {'rss MB':>7} {'child MB':>8}"
+    )
+    for case in cases:
+        if "error" in case:
+            print(
+                f"{case['engine']:<8} {case['concurrency']:>4}  failed: {case['error']}"
+            )
+            continue
+        print(
+            f"{case['engine']:<8} {case['concurrency']:>4} "
+            f"{case['checks_per_second']:>9} {case['p50_ms']:>8} {case['p95_ms']:>8} "
+            f"{case['p99_ms']:>8} {case['errors']:>6} {case['peak_rss_mb']:>7} "
+            f"{case['peak_child_rss_mb']:>8}"
+        )
+
+
+def main():
+    """Start the stand-in server and benchmark every engine/concurrency case."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--engines", default="http,browser", help="Comma-separated engines to run"
+    )
+    parser.add_argument(
+        "--concurrency", default="1,4,8", help="Comma-separated max_pages levels"
+    )
+    parser.add_argument("--checks", type=int, default=50, help="Checks per case")
+    parser.add_argument(
+        "--detection", default="mutation", help="Result detection for browser runs"
+    )
+    parser.add_argument(
+        "--delay", type=float, default=0.2, help="Stand-in response delay (seconds)"
+    )
+    parser.add_argument(
+        "--error-rate", type=float, default=0.0, help="Share of API calls that fail"
+    )
+    parser.add_argument(
+        "--payload-size", type=int, default=0, help="Extra bytes per response"
+    )
+    parser.add_argument("-o", "--output", default=RESULTS_PATH)
+    args = parser.parse_args()
+
+    server = standin_server.start_server(
+        delay=args.delay, error_rate=args.error_rate, payload_size=args.payload_size
+    )
+    host, port = server.server_address[:2]
+    base_url = f"http://{host}:{port}"
+    usernames = [f"bench{index:06d}" for index in range(args.checks)]
+
+    cases = []
+    try:
+        for engine in args.engines.split(","):
+            for concurrency in (int(level) for level in args.concurrency.split(",")):
+                print(f"[*] Running {engine} engine at concurrency {concurrency}...")
+                config = build_config(base_url, engine, concurrency, args.detection)
+                case = {"engine": engine, "concurrency": concurrency}
+                try:
+                    case.update(run_isolated(config, usernames))
+                except Exception as error:  # e.g. Chromium not installed
+                    case["error"] = str(error).splitlines()[0]
+                cases.append(case)
+    finally:
+        server.shutdown()
+
+    print()
+    print_table(cases)
+    append_results(
+        args.output,
+        {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "server": {
+                "delay": args.delay,
+                "error_rate": args.error_rate,
+                "payload_size": args.payload_size,
+            },
+            "detection": args.detection,
+            "cases": cases,
+        },
+    )
+    print(f"\n[+] Results appended to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
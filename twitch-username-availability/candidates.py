@@ -0,0 +1,133 @@
+"""Streaming username candidate sources, bounded-memory de-duplication and checkpoints."""
+
+import hashlib
+import itertools
+import json
+import math
+import os
+import sys
+
+# Characters Twitch allows in usernames
+TWITCH_CHARSET = "abcdefghijklmnopqrstuvwxyz0123456789_"
+
+
+def normalize_username(name):
+    """Return the form usernames are compared, cached and checked in.
+
+    Twitch usernames are case-insensitive, so "Foo" and "foo" are one name.
+    """
+    return name.strip().lower()
+
+
+def iter_lines(path):
+    """Yield stripped, non-empty lines from a file, or from stdin for "-"."""
+    if path == "-":
+        for line in sys.stdin:
+            if line.strip():
+                yield line.strip()
+        return
+    with open(path, "r", encoding="utf-8") as file:
+        for line in file:
+            if line.strip():
+                yield line.strip()
+
+
+def iter_pattern(min_length, max_length, charset=TWITCH_CHARSET):
+    """Yield every string of the given lengths over `charset`."""
+    for length in range(min_length, max_length + 1):
+        for chars in itertools.product(charset, repeat=length):
+            yield "".join(chars)
+
+
+def iter_wordlist_combinations(wordlist_paths, separator=""):
+    """Yield every combination taking one word from each wordlist, in order.
+
+    Wordlists are read into memory (they are the small side of the product);
+    the combinations themselves are generated lazily.
+    """
+    wordlists = [list(dict.fromkeys(iter_lines(path))) for path in wordlist_paths]
+    for words in itertools.product(*wordlists):
+        yield separator.join(words)
+
+
+def parse_length_range(value):
+    """Parse "4" or "4-6" into a (min, max) tuple."""
+    low, _, high = value.partition("-")
+    return int(low), int(high or low)
+
+
+class BloomFilter:
+    """Fixed-size probabilistic set for de-duplicating huge candidate streams.
+
+    Memory is fixed up front from `capacity` and `error_rate`; past capacity the
+    false-positive rate rises, so a small share of unique names may be dropped.
+    """
+
+    def __init__(self, capacity, error_rate=0.001):
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+    def add(self, item):
+        """Add an item; return True if it was (probably) already present."""
+        present = True
+        for pos in self._positions(item):
+            byte, bit = divmod(pos, 8)
+            if not self._bits[byte] & (1 << bit):
+                present = False
+                self._bits[byte] |= 1 << bit
+        return present
+
+
+class UniqueCandidates:
+    """Iterate (position, name) over normalized names not seen before.
+
+    Positions count every raw input item, so they can be used as a resume
+    offset, and `consumed` is the number of raw items read so far, duplicates
+    included.
+    """
+
+    def __init__(self, candidates, bloom):
+        self.candidates = candidates
+        self.bloom = bloom
+        self.consumed = 0
+
+    def __iter__(self):
+        for name in self.candidates:
+            position = self.consumed
+            self.consumed += 1
+            name = normalize_username(name)
+            if not self.bloom.add(name):
+                yield position, name
+
+
+def load_checkpoint(path, source):
+    """Return how many raw input items a previous run over `source` consumed."""
+    if not path or not os.path.exists(path):
+        return 0
+    with open(path, "r", encoding="utf-8") as file:
+        checkpoint = json.load(file)
+    if checkpoint.get("source") != source:
+        print(f"[!] Checkpoint {path} is for a different input, starting over.")
+        return 0
+    return checkpoint.get("consumed", 0)
+
+
+def save_checkpoint(path, source, consumed):
+    """Atomically record how many raw input items have been fully processed."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as file:
+        json.dump({"source": source, "consumed": consumed}, file)
+    os.replace(tmp_path, path)
+
+
+def clear_checkpoint(path):
+    """Remove a finished run's checkpoint so a rerun starts from the top."""
+    if path and os.path.exists(path):
+        os.remove(path)
@@ -0,0 +1,176 @@
+"""Background notification dispatcher with batching and rate-limit handling."""
+
+import atexit
+import queue
+import threading
+import time
+
+import requests
+
+DISCORD_MESSAGE_LIMIT = 2000
+CALLMEBOT_URL = "https://api.callmebot.com/whatsapp.php"
+# URL-encoded characters of text per CallMeBot GET, well under common URL limits
+CALLMEBOT_TEXT_LIMIT = 1500
+
+_STOP = object()
+
+
+def chunk_messages(messages, limit, measure=len):
+    """Join messages with newlines into as few chunks under `limit` as possible.
+
+    `measure` gives the size of a text against the limit, e.g. its URL-encoded
+    length; over-long messages are truncated to fit.
+    """
+    chunks = []
+    current = ""
+    for message in messages:
+        message = message[:limit]
+        while measure(message) > limit:
+            message = message[:-1]
+        candidate = f"{current}\n{message}" if current else message
+        if measure(candidate) > limit:
+            chunks.append(current)
+            candidate = message
+        current = candidate
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def retry_after_seconds(response):
+    """Read the server's requested wait from Retry-After or Discord's JSON body."""
+    header = response.headers.get("Retry-After")
+    if header:
+        try:
+            return float(header)
+        except ValueError:
+            pass
+    try:
+        return float(response.json().get("retry_after"))
+    except (ValueError, TypeError, AttributeError):
+        return None
+
+
+class NotificationDispatcher:
+    """Queue notifications and deliver them in batches from a background thread.
+
+    Messages queued within `batch_window_seconds` of the first one are merged into
+    a single Discord message (split at Discord's length limit) and a single
+    CallMeBot message. Rate-limited (429) and 5xx responses are retried after
+    Retry-After, or with exponential backoff when the server gives no hint. Any
+    queued messages are flushed by close(), which also runs at interpreter exit.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        dispatch_conf = config.get("dispatch", {})
+        self.batch_window = dispatch_conf.get("batch_window_seconds", 2.0)
+        self.max_retries = dispatch_conf.get("max_retries", 5)
+        self.backoff = dispatch_conf.get("backoff_seconds", 1.0)
+        self._session = requests.Session()
+        self._queue = queue.Queue()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="notifier", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    @property
+    def enabled(self):
+        """Whether any notification channel is enabled."""
+        return any(
+            self.config.get(channel, {}).get("enabled")
+            for channel in ("discord", "callmebot")
+        )
+
+    def notify(self, message):
+        """Queue a message for delivery without blocking the caller."""
+        if self.enabled and not self._closed:
+            self._queue.put(message)
+
+    def close(self, timeout=120):
+        """Deliver everything still queued and stop the background thread."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            print("[!] Notification dispatcher did not finish flushing in time.")
+        self._session.close()
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            first = self._queue.get()
+            if first is _STOP:
+                break
+            batch = [first]
+            deadline = time.monotonic() + self.batch_window
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._deliver(batch)
+
+    def _deliver(self, messages):
+        discord_conf = self.config.get("discord", {})
+        if discord_conf.get("enabled"):
+            for chunk in chunk_messages(messages, DISCORD_MESSAGE_LIMIT):
+                self._send_with_retry(
+                    "Discord",
+                    "🔔",
+                    lambda chunk=chunk: self._session.post(
+                        discord_conf["webhook_url"], json={"content": chunk}, timeout=10
+                    ),
+                )
+
+        callmebot_conf = self.config.get("callmebot", {})
+        if callmebot_conf.get("enabled"):
+            quote = requests.utils.quote
+            for chunk in chunk_messages(
+                messages, CALLMEBOT_TEXT_LIMIT, lambda text: len(quote(text))
+            ):
+                url = (
+                    f"{CALLMEBOT_URL}?phone={callmebot_conf['phone_number']}"
+                    f"&apikey={callmebot_conf['api_key']}&text={quote(chunk)}"
+                )
+                self._send_with_retry(
+                    "CallMeBot",
+                    "📱",
+                    lambda url=url: self._session.get(url, timeout=10),
+                )
+
+    def _send_with_retry(self, channel, icon, send):
+        for attempt in range(self.max_retries + 1):
+            delay = self.backoff * 2**attempt
+            try:
+                response = send()
+            except requests.RequestException as error:
+                print(f"[!] {channel} notification failed: {error}")
+            else:
+                if response.ok:
+                    print(f"[{icon}] {channel} notification sent.")
+                    return True
+                if response.status_code != 429 and response.status_code < 500:
+                    print(
+                        f"[!] {channel} notification rejected: "
+                        f"{response.status_code} {response.text[:200]}"
+                    )
+                    return False
+                delay = retry_after_seconds(response) or delay
+                print(
+                    f"[!] {channel} returned {response.status_code}, "
+                    f"retrying in {delay:.1f}s"
+                )
+            if attempt < self.max_retries:
+                time.sleep(delay)
+        print(f"[!] {channel} notification dropped after {self.max_retries} retries.")
+        return False
@@ -0,0 +1,168 @@
+"""Local stand-in for the username checker site, for offline testing of both engines.
+
+Serves a form page that mimics the real checker's markup (username input, submit
+button and a #result alert) plus the JSON endpoint the page calls. Point a config
+at it with:
+
+    "url": "http://127.0.0.1:8765/",
+    "api_url": "http://127.0.0.1:8765/api/check?username={username}",
+    "response_url_pattern": "/api/check"
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+DEFAULT_TAKEN = {"twitch", "ninja", "shroud", "pokimane"}
+
+CHECKER_PAGE = """<!DOCTYPE html>
+<html>
+<head><title>Username checker (stand-in)</title></head>
+<body>
+<form id="checker">
+    <input name="username" type="text">
+    <button type="submit">Check</button>
+</form>
+<div id="result"></div>
+<script>
+document.getElementById("checker").addEventListener("submit", async (event) => {
+    event.preventDefault();
+    const name = document.querySelector("input[name=username]").value;
+    const resp = await fetch("/api/check?username=" + encodeURIComponent(name));
+    const result = document.getElementById("result");
+    if (!resp.ok) {
+        result.className = "alert alert-warning";
+        result.innerText = "Error " + resp.status;
+        return;
+    }
+    const data = await resp.json();
+    result.className = "alert " + (data.available ? "alert-success" : "alert-danger");
+    result.innerText = data.message;
+});
+</script>
+</body>
+</html>
+"""
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    """Serve the checker page and its availability endpoint."""
+
+    server_version = "StandinChecker/1.0"
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        """Route GET requests to the page or the API."""
+        url = urlparse(self.path)
+        if url.path in ("/", "/twitch-username-checker"):
+            padding = f"<!-- {'x' * self.server.payload_size} -->\n"
+            page = CHECKER_PAGE.replace("</body>", padding + "</body>")
+            self._send(200, "text/html; charset=utf-8", page.encode("utf-8"))
+        elif url.path == "/api/check":
+            username = parse_qs(url.query).get("username", [""])[0].strip()
+            self._check(username)
+        else:
+            self._send(404, "text/plain", b"not found")
+
+    def _check(self, username):
+        if self.server.delay:
+            time.sleep(self.server.delay)
+        if self.server.error_rate and random.random() < self.server.error_rate:
+            self._send(500, "application/json", b'{"error": "simulated failure"}')
+            return
+        if not username:
+            self._send(400, "application/json", b'{"error": "username required"}')
+            return
+
+        available = username.lower() not in self.server.taken
+        payload = {
+            "username": username,
+            "available": available,
+            "message": (
+                f"{username} is available!" if available else f"{username} is taken."
+            ),
+        }
+        if self.server.payload_size:
+            payload["padding"] = "x" * self.server.payload_size
+        self._send(200, "application/json", json.dumps(payload).encode("utf-8"))
+
+    def _send(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+def start_server(
+    host="127.0.0.1",
+    port=0,
+    delay=0.0,
+    taken=None,
+    verbose=False,
+    error_rate=0.0,
+    payload_size=0,
+):
+    """Start the stand-in server on a background thread and return it.
+
+    Pass port=0 to pick a free port; the bound address is server.server_address.
+    `error_rate` is the share of API calls answered with HTTP 500 and
+    `payload_size` pads both the page and API responses by that many bytes.
+    Call server.shutdown() when done.
+    """
+    server = ThreadingHTTPServer((host, port), StandinHandler)
+    server.daemon_threads = True
+    server.delay = delay
+    server.taken = {name.lower() for name in (taken or DEFAULT_TAKEN)}
+    server.verbose = verbose
+    server.error_rate = error_rate
+    server.payload_size = payload_size
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    """Run the stand-in server in the foreground."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument(
+        "--delay", type=float, default=0.0, help="Seconds to wait before answering"
+    )
+    parser.add_argument(
+        "--taken", nargs="*", help="Usernames to report as taken (default: a few)"
+    )
+    parser.add_argument(
+        "--error-rate", type=float, default=0.0, help="Share of API calls that fail"
+    )
+    parser.add_argument(
+        "--payload-size", type=int, default=0, help="Extra bytes per response"
+    )
+    args = parser.parse_args()
+
+    server = start_server(
+        args.host,
+        args.port,
+        args.delay,
+        args.taken,
+        verbose=True,
+        error_rate=args.error_rate,
+        payload_size=args.payload_size,
+    )
+    host, port = server.server_address[:2]
+    print(f"[*] Stand-in checker running on http://{host}:{port}/ (Ctrl+C to stop)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""SQLite-backed cache of username check results and their notification state."""
+
+import sqlite3
+import time
+
+DEFAULT_TTL = {"available": 6 * 3600, "taken": 24 * 3600, "error": 0}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    username TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    result_text TEXT,
+    last_definite TEXT,
+    checked_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS stats (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+
+def result_status(result_text, is_available):
+    """Classify a check result as available, taken or error."""
+    if not result_text:
+        return "error"
+    return "available" if is_available else "taken"
+
+
+class StateStore:
+    """Remember each username's last result so fresh ones can be skipped.
+
+    Every status has its own TTL in seconds; a TTL of 0 means results with that
+    status are never served from the cache. Only "available" and "taken" count as
+    a definite state, so an error between two "available" results does not cause
+    a repeat notification.
+    """
+
+    def __init__(self, path, ttl=None):
+        self.ttl = {**DEFAULT_TTL, **(ttl or {})}
+        self.hits = 0
+        self.misses = 0
+        self._conn = sqlite3.connect(path)
+        self._conn.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def get_fresh(self, username):
+        """Return (result_text, is_available) if a fresh result is cached, else None."""
+        row = self._conn.execute(
+            "SELECT status, result_text, checked_at FROM results WHERE username = ?",
+            (username,),
+        ).fetchone()
+        if row:
+            status, result_text, checked_at = row
+            if time.time() - checked_at < self.ttl.get(status, 0):
+                self.hits += 1
+                return result_text, status == "available"
+        self.misses += 1
+        return None
+
+    def record(self, username, result_text, is_available):
+        """Store a new result; return True if the name just became available."""
+        status = result_status(result_text, is_available)
+        row = self._conn.execute(
+            "SELECT last_definite FROM results WHERE username = ?", (username,)
+        ).fetchone()
+        previous = row[0] if row else None
+        last_definite = previous if status == "error" else status
+
+        with self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results "
+                "(username, status, result_text, last_definite, checked_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (username, status, result_text, last_definite, time.time()),
+            )
+        return status == "available" and previous != "available"
+
+    def invalidate(self, usernames=None):
+        """Drop cached results for the given usernames (or all); return the count."""
+        with self._conn:
+            if usernames:
+                cursor = self._conn.executemany(
+                    "DELETE FROM results WHERE username = ?",
+                    [(name,) for name in usernames],
+                )
+            else:
+                cursor = self._conn.execute("DELETE FROM results")
+        return cursor.rowcount
+
+    def stats(self):
+        """Return lifetime hit/miss counters and cached entries per status."""
+        counters = dict(self._conn.execute("SELECT key, value FROM stats"))
+        statuses = dict(
+            self._conn.execute("SELECT status, COUNT(*) FROM results GROUP BY status")
+        )
+        return {
+            "hits": counters.get("hits", 0),
+            "misses": counters.get("misses", 0),
+            "entries": statuses,
+        }
+
+    def close(self):
+        """Persist this run's hit/miss counters and close the database."""
+        with self._conn:
+            for key, value in (("hits", self.hits), ("misses", self.misses)):
+                self._conn.execute(
+                    "INSERT INTO stats (key, value) VALUES (?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET value = value + excluded.value",
+                    (key, value),
+                )
+        self._conn.close()
+
+
+def hit_rate(hits, misses):
+    """Return the hit rate as a percentage."""
+    total = hits + misses
+    return 100.0 * hits / total if total else 0.0
@@ -0,0 +1,65 @@
+"""Tests for the HTTP engine against the local stand-in checker site."""
+
+import pytest
+
+import standin_server
+import twitch_username_check
+
+
+@pytest.fixture
+def server():
+    server = standin_server.start_server(port=0)
+    yield server
+    server.shutdown()
+
+
+@pytest.fixture
+def site_conf(server):
+    host, port = server.server_address[:2]
+    return {
+        "api_url": f"http://{host}:{port}/api/check?username={{username}}",
+        "api_available_key": "available",
+        "api_message_key": "message",
+    }
+
+
+@pytest.fixture
+def http_session():
+    session = twitch_username_check.create_http_session()
+    yield session
+    session.close()
+
+
+def test_available_username(site_conf, http_session):
+    result = twitch_username_check.check_username_http(
+        "freshname", site_conf, http_session
+    )
+
+    assert result == ("freshname is available!", True)
+
+
+def test_taken_username(site_conf, http_session):
+    result = twitch_username_check.check_username_http("Ninja", site_conf, http_session)
+
+    assert result == ("Ninja is taken.", False)
+
+
+def test_server_error_falls_back(server, site_conf, http_session):
+    server.error_rate = 1.0
+
+    result = twitch_username_check.check_username_http(
+        "freshname", site_conf, http_session
+    )
+
+    assert result is None
+
+
+def test_non_bool_available_key_falls_back(site_conf, http_session):
+    # The stand-in's "username" field is a string, not an availability flag
+    site_conf["api_available_key"] = "username"
+
+    result = twitch_username_check.check_username_http(
+        "freshname", site_conf, http_session
+    )
+
+    assert result is None
@@ -1,15 +1,61 @@
 """Twitch username checker with notifications and dynamic config."""
 
+import argparse
+import asyncio
+import functools
+import itertools
 import json
+import multiprocessing
 import os
+import queue
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
 
 import requests
+from playwright.async_api import async_playwright
 from playwright.sync_api import sync_playwright
 
+from candidates import (
+    TWITCH_CHARSET,
+    BloomFilter,
+    UniqueCandidates,
+    clear_checkpoint,
+    iter_lines,
+    iter_pattern,
+    iter_wordlist_combinations,
+    load_checkpoint,
+    normalize_username,
+    parse_length_range,
+    save_checkpoint,
+)
+from notifier import NotificationDispatcher
+from state_store import StateStore, hit_rate
+
 CONFIG_PATH = "config.json"
 NOTIFICATIONS_PATH = "notifications.json"
 USERNAMES_PATH = "usernames.txt"
 
+# Snapshot of the result element, used to spot when it changes after submit
+RESULT_STATE_JS = """(selector) => {
+    const el = document.querySelector(selector);
+    return el ? el.innerText.trim() + "|" + el.className : "";
+}"""
+# Resolves once the element has changed and carries a final-state class, so a
+# "Checking..." placeholder shown while the request runs is not read as a result
+RESULT_CHANGED_JS = """([selector, before, finalClasses]) => {
+    const el = document.querySelector(selector);
+    if (!el || !el.innerText.trim()) return false;
+    if (el.innerText.trim() + "|" + el.className === before) return false;
+    return finalClasses.some((name) => el.classList.contains(name));
+}"""
+# Classes the result element carries once the site has answered
+FINAL_RESULT_CLASSES = ["alert-success", "alert-danger", "alert-warning", "error"]
+
+# Screenshot files are written here so disk I/O never blocks a check;
+# the executor's threads are joined at interpreter exit, flushing pending writes
+SCREENSHOT_WRITER = ThreadPoolExecutor(max_workers=2, thread_name_prefix="screenshot")
+
 
 def load_json(file_path):
     """Load JSON from a file."""
@@ -20,114 +66,968 @@ def load_json(file_path):
         return json.load(file)
 
 
-def send_discord_notification(webhook_url, message):
-    """Send a message to a Discord webhook."""
-    try:
-        requests.post(webhook_url, json={"content": message}, timeout=10)
-        print("[🔔] Discord notification sent.")
-    except requests.RequestException as error:
-        print(f"[!] Discord notification failed: {error}")
+class TrafficStats:
+    """Decide which page requests to block and tally traffic per check.
 
+    Bytes received are the transfer sizes Chromium reports for each finished
+    request (headers plus encoded body), so chunked and compressed responses
+    are counted as they went over the wire. Blocked requests never download,
+    so their size is unknown unless network.measure_blocked is set: each
+    blocked request is then fetched outside the page to count its bytes
+    before being aborted. That costs the bandwidth it measures, so only turn
+    it on to find out what blocking saves.
+    """
 
-def send_callmebot_sms(phone_number, api_key, message):
-    """Send a message via CallMeBot."""
-    try:
-        url = (
-            f"https://api.callmebot.com/whatsapp.php?"
-            f"phone={phone_number}&apikey={api_key}&text={requests.utils.quote(message)}"
+    def __init__(self, network_conf=None):
+        network_conf = network_conf or {}
+        self.block_types = set(network_conf.get("block_resource_types", []))
+        self.allow_patterns = network_conf.get("allow_url_patterns", [])
+        self.deny_patterns = network_conf.get("deny_url_patterns", [])
+        self.measure_blocked = network_conf.get("measure_blocked", False)
+        self.checks = 0
+        self.blocked = 0
+        self.bytes_received = 0
+        self.bytes_blocked = 0
+
+    @property
+    def blocking(self):
+        """Whether any block rules are configured."""
+        return bool(self.block_types or self.deny_patterns)
+
+    def should_block(self, request):
+        """Return True if the request is denied and not explicitly allowed."""
+        url = request.url
+        if any(pattern in url for pattern in self.allow_patterns):
+            return False
+        if request.resource_type in self.block_types:
+            return True
+        return any(pattern in url for pattern in self.deny_patterns)
+
+    @staticmethod
+    def new_counter():
+        """Return a fresh per-page counter."""
+        return {"blocked": 0, "bytes": 0, "blocked_bytes": 0}
+
+    @staticmethod
+    def transfer_size(sizes):
+        """Bytes a finished request took on the wire, from request.sizes()."""
+        return max(sizes.get("responseHeadersSize", 0), 0) + max(
+            sizes.get("responseBodySize", 0), 0
         )
-        requests.get(url, timeout=10)
-        print("[📱] CallMeBot notification sent.")
-    except requests.RequestException as error:
-        print(f"[!] CallMeBot notification failed: {error}")
-
-
-def send_notifications(config, message):
-    """Dispatch notifications based on enabled services."""
-    if config.get("discord", {}).get("enabled"):
-        send_discord_notification(config["discord"]["webhook_url"], message)
-    if config.get("callmebot", {}).get("enabled"):
-        send_callmebot_sms(
-            config["callmebot"]["phone_number"], config["callmebot"]["api_key"], message
+
+    def count_request(self, counter, request):
+        """Add a finished request's transfer size to the page counter."""
+        try:
+            counter["bytes"] += self.transfer_size(request.sizes())
+        except Exception:  # the page closed before the sizes could be read
+            pass
+
+    async def count_request_async(self, counter, request):
+        """Async variant of count_request."""
+        try:
+            counter["bytes"] += self.transfer_size(await request.sizes())
+        except Exception:  # the page closed before the sizes could be read
+            pass
+
+    def finish(self, label, counter):
+        """Fold a finished page's counter into the run totals and print it."""
+        self.checks += 1
+        self.blocked += counter["blocked"]
+        self.bytes_received += counter["bytes"]
+        self.bytes_blocked += counter["blocked_bytes"]
+        print(
+            f"[📶] {label}: {counter['blocked']} requests blocked"
+            f"{self._saved(counter['blocked_bytes'])}, "
+            f"{counter['bytes'] / 1024:.1f} KB received"
         )
 
+    def _saved(self, blocked_bytes):
+        if not self.measure_blocked:
+            return ""
+        return f" ({blocked_bytes / 1024:.1f} KB saved)"
+
+    def print_summary(self):
+        """Print run totals for blocked requests and bytes received."""
+        if not self.checks:
+            return
+        print(
+            f"[📶] {self.checks} pages: {self.blocked} requests blocked"
+            f"{self._saved(self.bytes_blocked)}, "
+            f"{self.bytes_received / 1024:.1f} KB received "
+            f"({self.bytes_received / 1024 / self.checks:.1f} KB per check)"
+        )
+
+
+def screenshot_policy(screenshot_conf):
+    """Return the screenshot policy, honouring the legacy `enabled` flag.
+
+    Policies: "always" captures every check (the shipped default, as with the
+    old `"enabled": true`), "on_error" only checks that got no result, which
+    saves a capture per check on long runs, "on_available" only available
+    names and "never" nothing.
+    """
+    if "policy" in screenshot_conf:
+        return screenshot_conf["policy"]
+    return "always" if screenshot_conf.get("enabled", False) else "never"
+
+
+def wants_screenshot(screenshot_conf, result_text, is_available):
+    """Decide from the policy whether this check's page should be captured."""
+    policy = screenshot_policy(screenshot_conf)
+    if policy == "always":
+        return True
+    if policy == "on_available":
+        return bool(result_text) and is_available
+    if policy == "on_error":
+        return not result_text
+    return False
+
+
+def write_screenshot(path, data):
+    """Write captured PNG bytes to disk."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "wb") as file:
+        file.write(data)
+    print(f"[*] Screenshot saved: {path}")
+
+
+def save_screenshot_in_background(screenshot_conf, username, data):
+    """Queue a captured screenshot to be written off the check's critical path."""
+    path = screenshot_conf["path_format"].format(username=username)
+    SCREENSHOT_WRITER.submit(write_screenshot, path, data)
+
+
+class BrowserSession:
+    """Long-lived Chromium instance that hands out a fresh page per check."""
+
+    def __init__(self, browser_conf=None, traffic=None):
+        browser_conf = browser_conf or {}
+        self.isolated = browser_conf.get("isolated", False)
+        self.recycle_after = browser_conf.get("recycle_after", 100)
+        self.traffic = traffic or TrafficStats()
+        self._playwright = None
+        self._browser = None
+        self._checks = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self._close_browser()
+        if self._playwright is not None:
+            self._playwright.stop()
+
+    def _launch_browser(self):
+        # Started lazily so HTTP-engine runs never spawn a browser at all
+        if self._playwright is None:
+            self._playwright = sync_playwright().start()
+        self._browser = self._playwright.chromium.launch(headless=True)
+        self._checks = 0
+
+    def _close_browser(self):
+        if self._browser is not None:
+            self._browser.close()
+            self._browser = None
+
+    def _route(self, route, counter):
+        if self.traffic.should_block(route.request):
+            counter["blocked"] += 1
+            if self.traffic.measure_blocked:
+                try:
+                    counter["blocked_bytes"] += len(route.fetch().body())
+                except Exception:  # measuring is best effort, block regardless
+                    pass
+            route.abort()
+        else:
+            route.continue_()
+
+    @contextmanager
+    def page(self, label="page"):
+        """Yield a page in its own context, recycling the browser when due."""
+        if self._browser is None or self._checks >= self.recycle_after:
+            if self._browser is not None:
+                print(f"[*] Recycling browser after {self._checks} checks")
+            self._close_browser()
+            self._launch_browser()
+
+        context = self._browser.new_context()
+        counter = self.traffic.new_counter()
+        if self.traffic.blocking:
+            context.route("**/*", lambda route: self._route(route, counter))
+        context.on(
+            "requestfinished",
+            lambda request: self.traffic.count_request(counter, request),
+        )
+        try:
+            yield context.new_page()
+        finally:
+            context.close()
+            self.traffic.finish(label, counter)
+            self._checks += 1
+            if self.isolated:
+                self._close_browser()
+
+
+def create_http_session(pool_size=10):
+    """Create a keep-alive session for the HTTP engine."""
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(
+        pool_connections=1, pool_maxsize=max(1, pool_size)
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
 
-def check_username_availability(username, site_conf, screenshot_conf):
-    """Check if a Twitch username is available."""
-    print(f"\n[*] Checking username: {username}")
 
-    with sync_playwright() as playwright:
-        browser = playwright.chromium.launch(headless=True)
-        page = browser.new_page()
-        page.goto(site_conf["url"])
+def check_username_http(username, site_conf, http_session):
+    """Query the checker's backend endpoint directly.
 
-        page.fill(site_conf["username_field"], username)
+    Returns (result_text, is_available), or None if the response is unusable
+    and the caller should fall back to the browser.
+    """
+    api_url = site_conf.get("api_url")
+    if not api_url:
+        print("[!] site.api_url is not set, HTTP engine unavailable.")
+        return None
+
+    url = api_url.format(username=requests.utils.quote(username))
+    try:
+        resp = http_session.get(url, timeout=10)
+        resp.raise_for_status()
+        data = resp.json()
+    except (requests.RequestException, ValueError) as error:
+        print(f"[!] HTTP check failed for {username}: {error}")
+        return None
+
+    available_key = site_conf.get("api_available_key", "available")
+    message_key = site_conf.get("api_message_key", "message")
+    is_available = data.get(available_key) if isinstance(data, dict) else None
+    if not isinstance(is_available, bool):
+        print(f"[!] Unexpected HTTP response for {username}: {str(data)[:200]}")
+        return None
+
+    result_text = data.get(message_key) or ("Available" if is_available else "Taken")
+    return str(result_text).strip(), is_available
+
+
+class LatencyReport:
+    """Collect per-check latencies and print a summary at the end of a run."""
+
+    def __init__(self, label):
+        self.label = label
+        self.samples = []
+
+    def record(self, username, seconds):
+        """Store one check's latency and print it."""
+        self.samples.append(seconds)
+        print(f"[⏱] {username}: {seconds * 1000:.0f} ms")
+
+    def percentile(self, pct):
+        """Return the nearest-rank percentile of recorded latencies in seconds."""
+        ordered = sorted(self.samples)
+        index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+        return ordered[index]
+
+    def print_summary(self):
+        """Print count, mean and percentile latencies for the run."""
+        if not self.samples:
+            return
+        mean = sum(self.samples) / len(self.samples)
+        print(
+            f"\n[⏱] {len(self.samples)} checks ({self.label}): "
+            f"avg {mean * 1000:.0f} ms, p50 {self.percentile(50) * 1000:.0f} ms, "
+            f"p95 {self.percentile(95) * 1000:.0f} ms, "
+            f"max {max(self.samples) * 1000:.0f} ms"
+        )
+
+
+def result_changed_args(site_conf, before):
+    """Arguments for RESULT_CHANGED_JS."""
+    final_classes = site_conf.get("final_result_classes", FINAL_RESULT_CLASSES)
+    return [site_conf["result_selector"], before, final_classes]
+
+
+def response_matcher(site_conf):
+    """Build a predicate matching the checker site's backend response."""
+    pattern = site_conf.get("response_url_pattern", "")
+    return lambda response: pattern in response.url
+
+
+def submit_and_wait(page, site_conf):
+    """Submit the form and block until the result is ready per site.detection."""
+    detection = site_conf.get("detection", "fixed")
+    selector = site_conf["result_selector"]
+
+    if detection == "fixed":
         page.click(site_conf["submit_button"])
         page.wait_for_timeout(1500)  # Wait 1.5 seconds to let the result load
+        return
+
+    before = page.evaluate(RESULT_STATE_JS, selector)
+    if detection == "response":
+        with page.expect_response(response_matcher(site_conf), timeout=10000):
+            page.click(site_conf["submit_button"])
+    else:
+        page.click(site_conf["submit_button"])
+    page.wait_for_function(
+        RESULT_CHANGED_JS, arg=result_changed_args(site_conf, before), timeout=10000
+    )
 
+
+def check_username_availability(
+    username, site_conf, screenshot_conf, session=None, latency_report=None
+):
+    """Check if a Twitch username is available."""
+    if session is None:
+        with BrowserSession({"isolated": True}) as own_session:
+            return check_username_availability(
+                username, site_conf, screenshot_conf, own_session, latency_report
+            )
+
+    print(f"\n[*] Checking username: {username}")
+    started = time.perf_counter()
+
+    with session.page(username) as page:
         try:
+            page.goto(site_conf["url"])
+            page.fill(site_conf["username_field"], username)
+            submit_and_wait(page, site_conf)
             page.wait_for_selector(site_conf["result_selector"], timeout=10000)
             result_elem = page.query_selector(site_conf["result_selector"])
 
             if not result_elem:
                 print("[!] No result element found.")
-                return None, False
-
-            result_text = result_elem.inner_text().strip()
-            result_classes = result_elem.get_attribute("class") or ""
+                result_text = None
+                is_available = False
+            else:
+                result_text = result_elem.inner_text().strip()
+                result_classes = result_elem.get_attribute("class") or ""
 
-            print(f"[DEBUG] Result text: {result_text}")
-            print(f"[DEBUG] Result classes: {result_classes}")
+                print(f"[DEBUG] Result text: {result_text}")
+                print(f"[DEBUG] Result classes: {result_classes}")
 
-            is_available = "alert-success" in result_classes
+                is_available = "alert-success" in result_classes
 
         except Exception as error:
             print(f"[!] Error while checking username: {error}")
             result_text = None
             is_available = False
 
-        if screenshot_conf.get("enabled", False):
-            screenshot_path = screenshot_conf["path_format"].format(username=username)
-            page.screenshot(path=screenshot_path, full_page=True)
-            print(f"[*] Screenshot saved: {screenshot_path}")
+        if latency_report is not None:
+            latency_report.record(username, time.perf_counter() - started)
+
+        if wants_screenshot(screenshot_conf, result_text, is_available):
+            data = page.screenshot(full_page=screenshot_conf.get("full_page", True))
+            save_screenshot_in_background(screenshot_conf, username, data)
+
+        return result_text, is_available
+
+
+def check_username(
+    username,
+    site_conf,
+    screenshot_conf,
+    session,
+    http_session=None,
+    latency_report=None,
+):
+    """Check a username with the configured engine, falling back to the browser."""
+    if site_conf.get("engine", "browser") == "http" and http_session is not None:
+        started = time.perf_counter()
+        result = check_username_http(username, site_conf, http_session)
+        if result is not None:
+            if latency_report is not None:
+                latency_report.record(username, time.perf_counter() - started)
+            return result
+        print(f"[*] Falling back to browser for {username}")
+
+    return check_username_availability(
+        username, site_conf, screenshot_conf, session, latency_report
+    )
+
+
+class AsyncBrowserSession:
+    """Shared async Chromium instance that many concurrent checks draw pages from."""
+
+    def __init__(self, browser_conf=None, traffic=None):
+        browser_conf = browser_conf or {}
+        self.isolated = browser_conf.get("isolated", False)
+        self.recycle_after = browser_conf.get("recycle_after", 100)
+        self.traffic = traffic or TrafficStats()
+        self._playwright = None
+        self._browser = None
+        self._checks = 0
+        self._open_pages = {}
+        self._lock = asyncio.Lock()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        for browser in list(self._open_pages):
+            await browser.close()
+        self._open_pages.clear()
+        self._browser = None
+        if self._playwright is not None:
+            await self._playwright.stop()
+
+    async def _launch_browser(self):
+        if self._playwright is None:
+            self._playwright = await async_playwright().start()
+        return await self._playwright.chromium.launch(headless=True)
+
+    async def _acquire_browser(self):
+        async with self._lock:
+            if self.isolated:
+                browser = await self._launch_browser()
+                self._open_pages[browser] = 0
+            else:
+                if self._browser is None or self._checks >= self.recycle_after:
+                    retiring = self._browser
+                    if retiring is not None:
+                        print(f"[*] Recycling browser after {self._checks} checks")
+                    self._browser = await self._launch_browser()
+                    self._open_pages[self._browser] = 0
+                    self._checks = 0
+                    if retiring is not None and not self._open_pages[retiring]:
+                        del self._open_pages[retiring]
+                        await retiring.close()
+                browser = self._browser
+                self._checks += 1
+            self._open_pages[browser] += 1
+            return browser
+
+    async def _release_browser(self, browser):
+        async with self._lock:
+            self._open_pages[browser] -= 1
+            # Browsers retired by recycling are closed once their last page is done
+            if browser is not self._browser and not self._open_pages[browser]:
+                del self._open_pages[browser]
+                await browser.close()
+
+    async def _route(self, route, counter):
+        if self.traffic.should_block(route.request):
+            counter["blocked"] += 1
+            if self.traffic.measure_blocked:
+                try:
+                    response = await route.fetch()
+                    counter["blocked_bytes"] += len(await response.body())
+                except Exception:  # measuring is best effort, block regardless
+                    pass
+            await route.abort()
+        else:
+            await route.continue_()
+
+    @asynccontextmanager
+    async def page(self, label="page"):
+        """Yield a page in its own context on the shared browser."""
+        browser = await self._acquire_browser()
+        try:
+            context = await browser.new_context()
+            counter = self.traffic.new_counter()
+            if self.traffic.blocking:
+                await context.route("**/*", lambda route: self._route(route, counter))
+            context.on(
+                "requestfinished",
+                lambda request: self.traffic.count_request_async(counter, request),
+            )
+            try:
+                yield await context.new_page()
+            finally:
+                await context.close()
+                self.traffic.finish(label, counter)
+        finally:
+            await self._release_browser(browser)
+
+
+class AsyncRateLimiter:
+    """Space out check start times to at most `rate` per second."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next_slot = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        """Sleep until the next start slot is free."""
+        if not self.interval:
+            return
+        async with self._lock:
+            now = asyncio.get_running_loop().time()
+            delay = self._next_slot - now
+            self._next_slot = max(now, self._next_slot) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+async def submit_and_wait_async(page, site_conf):
+    """Async variant of submit_and_wait."""
+    detection = site_conf.get("detection", "fixed")
+    selector = site_conf["result_selector"]
+
+    if detection == "fixed":
+        await page.click(site_conf["submit_button"])
+        await page.wait_for_timeout(1500)  # Wait 1.5 seconds to let the result load
+        return
+
+    before = await page.evaluate(RESULT_STATE_JS, selector)
+    if detection == "response":
+        async with page.expect_response(response_matcher(site_conf), timeout=10000):
+            await page.click(site_conf["submit_button"])
+    else:
+        await page.click(site_conf["submit_button"])
+    await page.wait_for_function(
+        RESULT_CHANGED_JS, arg=result_changed_args(site_conf, before), timeout=10000
+    )
+
+
+async def check_username_availability_async(
+    username, site_conf, screenshot_conf, session, latency_report=None
+):
+    """Async variant of check_username_availability using a shared session."""
+    print(f"\n[*] Checking username: {username}")
+    started = time.perf_counter()
+
+    async with session.page(username) as page:
+        try:
+            await page.goto(site_conf["url"])
+            await page.fill(site_conf["username_field"], username)
+            await submit_and_wait_async(page, site_conf)
+            await page.wait_for_selector(site_conf["result_selector"], timeout=10000)
+            result_elem = await page.query_selector(site_conf["result_selector"])
+
+            if not result_elem:
+                print(f"[!] No result element found for {username}.")
+                result_text = None
+                is_available = False
+            else:
+                result_text = (await result_elem.inner_text()).strip()
+                result_classes = await result_elem.get_attribute("class") or ""
+
+                print(f"[DEBUG] {username} result text: {result_text}")
+                print(f"[DEBUG] {username} result classes: {result_classes}")
+
+                is_available = "alert-success" in result_classes
+
+        except Exception as error:
+            print(f"[!] Error while checking username {username}: {error}")
+            result_text = None
+            is_available = False
+
+        if latency_report is not None:
+            latency_report.record(username, time.perf_counter() - started)
+
+        if wants_screenshot(screenshot_conf, result_text, is_available):
+            data = await page.screenshot(
+                full_page=screenshot_conf.get("full_page", True)
+            )
+            save_screenshot_in_background(screenshot_conf, username, data)
 
-        browser.close()
         return result_text, is_available
 
 
+async def check_username_async(
+    username,
+    site_conf,
+    screenshot_conf,
+    session,
+    http_session=None,
+    latency_report=None,
+):
+    """Async variant of check_username; HTTP calls run in a worker thread."""
+    if site_conf.get("engine", "browser") == "http" and http_session is not None:
+        started = time.perf_counter()
+        result = await asyncio.to_thread(
+            check_username_http, username, site_conf, http_session
+        )
+        if result is not None:
+            if latency_report is not None:
+                latency_report.record(username, time.perf_counter() - started)
+            return result
+        print(f"[*] Falling back to browser for {username}")
+
+    return await check_username_availability_async(
+        username, site_conf, screenshot_conf, session, latency_report
+    )
+
+
+async def check_usernames_async(
+    usernames, config, latency_report=None, traffic=None, on_result=None
+):
+    """Check usernames concurrently and return results in input order.
+
+    A check that raises counts as (None, False) instead of aborting the run.
+    `on_result(username, result_text, is_available)` is called for each result
+    in input order as soon as it and every earlier one are done.
+    """
+    site_conf = config["site"]
+    screenshot_conf = config.get("screenshots", {})
+    concurrency_conf = config.get("concurrency", {})
+    max_pages = max(1, concurrency_conf.get("max_pages", 4))
+    semaphore = asyncio.Semaphore(max_pages)
+    limiter = AsyncRateLimiter(concurrency_conf.get("requests_per_second", 0))
+    http_session = create_http_session(max_pages)
+
+    async with AsyncBrowserSession(config.get("browser", {}), traffic) as session:
+
+        async def bounded_check(username):
+            async with semaphore:
+                await limiter.wait()
+                try:
+                    return await check_username_async(
+                        username,
+                        site_conf,
+                        screenshot_conf,
+                        session,
+                        http_session,
+                        latency_report,
+                    )
+                except Exception as error:  # one failed check must not end the run
+                    print(f"[!] Error while checking username {username}: {error}")
+                    return None, False
+
+        tasks = [asyncio.create_task(bounded_check(name)) for name in usernames]
+        results = []
+        for username, task in zip(usernames, tasks):
+            result = await task
+            if on_result is not None:
+                on_result(username, *result)
+            results.append(result)
+        return results
+
+
 def load_usernames():
     """Load usernames from a static file."""
     if not os.path.exists(USERNAMES_PATH):
         print(f"[!] Usernames file not found: {USERNAMES_PATH}")
         return []
     with open(USERNAMES_PATH, "r", encoding="utf-8") as file:
-        return [line.strip() for line in file if line.strip()]
+        names = (normalize_username(line) for line in file if line.strip())
+        return list(dict.fromkeys(names))
+
+
+def report_result(username, result_text, is_available, notifier, state_store=None):
+    """Print a check result and notify if the username is available.
+
+    With a state store, only names that just changed to available are notified.
+    """
+    notify = is_available
+    if state_store is not None:
+        notify = state_store.record(username, result_text, is_available)
+
+    if result_text:
+        print(f"[✔️] {username}: {result_text}")
+        if is_available and not notify:
+            print(f"[*] {username} was already available, not notifying again.")
+        elif notify:
+            msg = f'Username "{username}" is available on Twitch.'
+            notifier.notify(msg)
+    else:
+        print(f"[❌] {username}: No result found.")
+
+
+def skip_cached(usernames, state_store):
+    """Print cached results and return the usernames that still need a check."""
+    if state_store is None:
+        return usernames
+
+    pending = []
+    for username in usernames:
+        cached = state_store.get_fresh(username)
+        if cached is None:
+            pending.append(username)
+        else:
+            print(f"[💾] {username}: {cached[0]} (cached)")
+    return pending
+
+
+def print_cache_stats(state_store):
+    """Print lifetime cache hit rate and cached entries per status."""
+    stats = state_store.stats()
+    rate = hit_rate(stats["hits"], stats["misses"])
+    print(
+        f"[💾] Cache hits: {stats['hits']}, misses: {stats['misses']} "
+        f"({rate:.1f}% hit rate)"
+    )
+    for status, count in sorted(stats["entries"].items()):
+        print(f"    {status}: {count} cached")
+
+
+def run_checks(usernames, config, notifier, latency_report, traffic, state_store):
+    """Check an in-memory list of usernames in the configured concurrency mode."""
+    if config.get("concurrency", {}).get("mode") == "async":
+        asyncio.run(
+            check_usernames_async(
+                usernames,
+                config,
+                latency_report,
+                traffic,
+                on_result=functools.partial(
+                    report_result, notifier=notifier, state_store=state_store
+                ),
+            )
+        )
+        return
+
+    site_conf = config["site"]
+    screenshot_conf = config.get("screenshots", {})
+    http_session = create_http_session()
+    with BrowserSession(config.get("browser", {}), traffic) as session:
+        for username in usernames:
+            result_text, is_available = check_username(
+                username,
+                site_conf,
+                screenshot_conf,
+                session,
+                http_session,
+                latency_report,
+            )
+            report_result(username, result_text, is_available, notifier, state_store)
+
+
+def candidate_stream(args):
+    """Chain the requested candidate sources; also return a key for checkpoints."""
+    sources = []
+    description = []
+    for path in args.input or []:
+        sources.append(iter_lines(path))
+        description.append(f"input={path}")
+    if args.generate:
+        low, high = parse_length_range(args.generate)
+        sources.append(iter_pattern(low, high, args.charset))
+        description.append(f"generate={args.generate}:{args.charset}")
+    if args.wordlist:
+        sources.append(iter_wordlist_combinations(args.wordlist, args.separator))
+        description.append(f"wordlists={','.join(args.wordlist)}:{args.separator}")
+    return itertools.chain(*sources), ";".join(description)
+
+
+def shard_worker(config, tasks, results):
+    """Worker process: check (index, username) tasks until a None sentinel."""
+    site_conf = config["site"]
+    screenshot_conf = config.get("screenshots", {})
+    traffic = TrafficStats(config.get("network", {}))
+    http_session = create_http_session()
+
+    with BrowserSession(config.get("browser", {}), traffic) as session:
+        for index, username in iter(tasks.get, None):
+            started = time.perf_counter()
+            try:
+                result_text, is_available = check_username(
+                    username, site_conf, screenshot_conf, session, http_session
+                )
+            except Exception as error:  # keep the worker alive for the next task
+                print(f"[!] Error while checking username {username}: {error}")
+                result_text, is_available = None, False
+            results.put(
+                (index, result_text, is_available, time.perf_counter() - started)
+            )
+
+    traffic.print_summary()
+
+
+def collect_results(results, count, workers):
+    """Wait for `count` worker results, failing if every worker has died."""
+    collected = {}
+    while len(collected) < count:
+        try:
+            index, *result = results.get(timeout=5)
+        except queue.Empty:
+            if not any(worker.is_alive() for worker in workers):
+                raise RuntimeError("All checker worker processes exited unexpectedly")
+            continue
+        collected[index] = result
+    return [collected[index] for index in range(count)]
+
+
+def run_sharded(args, config, notifier, latency_report, state_store):
+    """Stream candidates through worker processes in checkpointed batches.
+
+    Memory stays constant: input is read lazily, de-duplicated with a fixed-size
+    Bloom filter and dispatched one batch at a time. After each batch the number
+    of raw input items consumed is checkpointed, so a rerun with the same input
+    and --checkpoint skips straight past completed work. The checkpoint is
+    removed once the input is exhausted.
+    """
+    candidates, source = candidate_stream(args)
+    consumed = load_checkpoint(args.checkpoint, source)
+    if consumed:
+        print(f"[*] Resuming after {consumed} input items from {args.checkpoint}")
+
+    context = multiprocessing.get_context("spawn")
+    tasks = context.Queue()
+    results = context.Queue()
+    workers = [
+        context.Process(target=shard_worker, args=(config, tasks, results), daemon=True)
+        for _ in range(max(1, args.workers))
+    ]
+    for worker in workers:
+        worker.start()
+
+    stream = UniqueCandidates(candidates, BloomFilter(args.dedupe_capacity))
+    names = iter(stream)
+    try:
+        exhausted = False
+        while not exhausted:
+            batch = []
+            for position, username in names:
+                if position < consumed:
+                    continue
+                cached = state_store.get_fresh(username) if state_store else None
+                if cached is not None:
+                    print(f"[💾] {username}: {cached[0]} (cached)")
+                    continue
+                batch.append(username)
+                if len(batch) >= args.batch_size:
+                    break
+            else:
+                exhausted = True
+
+            for index, username in enumerate(batch):
+                tasks.put((index, username))
+            batch_results = collect_results(results, len(batch), workers)
+            for username, (result_text, is_available, elapsed) in zip(
+                batch, batch_results
+            ):
+                latency_report.record(username, elapsed)
+                report_result(
+                    username, result_text, is_available, notifier, state_store
+                )
+
+            if exhausted:
+                clear_checkpoint(args.checkpoint)
+            elif args.checkpoint:
+                save_checkpoint(args.checkpoint, source, stream.consumed)
+    finally:
+        for _ in workers:
+            tasks.put(None)
+        for worker in workers:
+            worker.join(timeout=60)
 
 
 def main():
     """Main script execution."""
-    config = load_json(CONFIG_PATH)
-    notifications = load_json(NOTIFICATIONS_PATH)
+    parser = argparse.ArgumentParser(description="Check Twitch username availability.")
+    parser.add_argument(
+        "-c", "--config", default=CONFIG_PATH, help="Path to the checker config"
+    )
+    parser.add_argument(
+        "--no-cache", action="store_true", help="Ignore the result cache for this run"
+    )
+    parser.add_argument(
+        "--cache-stats", action="store_true", help="Print cache hit rates and exit"
+    )
+    parser.add_argument(
+        "--invalidate-cache",
+        nargs="*",
+        metavar="USERNAME",
+        help="Drop cached results for the given usernames (all if none) and exit",
+    )
+    stream_group = parser.add_argument_group(
+        "streaming",
+        "Stream candidates through worker processes instead of reading "
+        f"{USERNAMES_PATH} into memory",
+    )
+    stream_group.add_argument(
+        "-i",
+        "--input",
+        action="append",
+        metavar="PATH",
+        help="Candidate file, one per line ('-' for stdin); repeatable",
+    )
+    stream_group.add_argument(
+        "--generate", metavar="LENGTHS", help="Generate all names of length N or N-M"
+    )
+    stream_group.add_argument(
+        "--charset", default=TWITCH_CHARSET, help="Characters used by --generate"
+    )
+    stream_group.add_argument(
+        "--wordlist",
+        action="append",
+        metavar="PATH",
+        help="Combine one word from each given wordlist; repeatable",
+    )
+    stream_group.add_argument(
+        "--separator", default="", help="Joiner for --wordlist combinations"
+    )
+    stream_group.add_argument(
+        "-w", "--workers", type=int, default=1, help="Checker worker processes"
+    )
+    stream_group.add_argument(
+        "--batch-size", type=int, default=50, help="Candidates per checkpointed batch"
+    )
+    stream_group.add_argument(
+        "--checkpoint", metavar="PATH", help="Resume file for interrupted runs"
+    )
+    stream_group.add_argument(
+        "--dedupe-capacity",
+        type=int,
+        default=10_000_000,
+        help="Expected unique candidates; sizes the de-duplication filter",
+    )
+    args = parser.parse_args()
+
+    config = load_json(args.config)
     site_conf = config["site"]
-    screenshot_conf = config.get("screenshots", {})
-    usernames = load_usernames()
+    cache_conf = config.get("cache", {})
+    if site_conf.get("detection") == "response" and not site_conf.get(
+        "response_url_pattern"
+    ):
+        parser.error(
+            "site.detection is 'response' but site.response_url_pattern is empty"
+        )
 
-    if not usernames:
-        print("[!] No usernames to check.")
+    state_store = None
+    if cache_conf.get("enabled") and not args.no_cache:
+        state_store = StateStore(
+            cache_conf.get("path", "state.db"), cache_conf.get("ttl")
+        )
+    elif args.cache_stats or args.invalidate_cache is not None:
+        print("[!] Cache is disabled in config.")
         return
 
-    for username in usernames:
-        result_text, is_available = check_username_availability(
-            username, site_conf, screenshot_conf
+    try:
+        if args.cache_stats:
+            print_cache_stats(state_store)
+            return
+        if args.invalidate_cache is not None:
+            removed = state_store.invalidate(args.invalidate_cache)
+            print(f"[💾] Invalidated {removed} cached result(s).")
+            return
+
+        notifier = NotificationDispatcher(load_json(NOTIFICATIONS_PATH))
+        traffic = TrafficStats(config.get("network", {}))
+        latency_report = LatencyReport(
+            f"{site_conf.get('engine', 'browser')} engine, "
+            f"{site_conf.get('detection', 'fixed')} detection"
         )
 
-        if result_text:
-            print(f"[✔️] {username}: {result_text}")
-            if is_available:
-                msg = f'Username "{username}" is available on Twitch.'
-                send_notifications(notifications, msg)
+        if args.input or args.generate or args.wordlist:
+            run_sharded(args, config, notifier, latency_report, state_store)
         else:
-            print(f"[❌] {username}: No result found.")
+            usernames = load_usernames()
+            if not usernames:
+                print("[!] No usernames to check.")
+                return
+            usernames = skip_cached(usernames, state_store)
+            run_checks(
+                usernames, config, notifier, latency_report, traffic, state_store
+            )
+
+        notifier.close()
+        latency_report.print_summary()
+        traffic.print_summary()
+        if state_store is not None:
+            rate = hit_rate(state_store.hits, state_store.misses)
+            print(
+                f"[💾] This run: {state_store.hits} cached, "
+                f"{state_store.misses} checked ({rate:.1f}% hit rate)"
+            )
+    finally:
+        if state_store is not None:
+            state_store.close()
 
 
 if __name__ == "__main__":